@@ -0,0 +1,93 @@
+"""
+Cold start import benchmark. Imports each entry module in a fresh
+interpreter with -X importtime and checks the results against
+import_budget.json.
+
+Usage: python benchmarks/import_time.py [--runs N] [--top N]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BUDGET_PATH = Path(__file__).resolve().parent / "import_budget.json"
+
+
+def measure(module):
+    """
+    Imports module in a fresh interpreter and returns
+    (self time per imported module, cumulative time of module) in microseconds
+    """
+    env = os.environ | {"TELEGRAM_TOKEN": os.getenv("TELEGRAM_TOKEN", "test-token")}
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+        env=env,
+    )
+    if res.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{res.stderr}")
+
+    self_times = {}
+    total = 0
+    for line in res.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        name = name.strip()
+        self_times[name] = int(self_us)
+        if name == module:
+            total = int(cumulative_us)
+    return self_times, total
+
+
+def breakdown(self_times):
+    packages = defaultdict(int)
+    for name, self_us in self_times.items():
+        packages[name.split(".")[0]] += self_us
+    return sorted(packages.items(), key=lambda x: x[1], reverse=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(BUDGET_PATH, "r") as f:
+        budget = json.load(f)
+
+    failures = []
+    for module, limits in budget.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        total_ms = statistics.median(total for _, total in runs) / 1000
+        self_times = runs[-1][0]
+
+        print(f"{module}: {total_ms:.1f} ms (budget {limits['maxMs']} ms)")
+        for package, self_us in breakdown(self_times)[: args.top]:
+            print(f"  {package.ljust(24)} {self_us / 1000:8.1f} ms")
+
+        if total_ms > limits["maxMs"]:
+            failures.append(f"{module} took {total_ms:.1f} ms, budget is {limits['maxMs']} ms")
+        forbidden = [
+            package
+            for package in limits.get("forbidden", [])
+            if any(name == package or name.startswith(f"{package}.") for name in self_times)
+        ]
+        if forbidden:
+            failures.append(f"{module} imports {', '.join(forbidden)}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
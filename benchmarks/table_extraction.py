@@ -0,0 +1,70 @@
+"""
+Per row cost of table extraction: parsel XPath strings evaluated for
+every row compared to the compiled TableExtractor.
+
+Usage: python benchmarks/table_extraction.py [--rows N] [--repeat N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from parsel import Selector  # noqa: E402
+from src.common.tables import Column, TableExtractor  # noqa: E402
+
+EXTRACTOR = TableExtractor(
+    [
+        Column("position", "Pos", 0),
+        Column("driver", "Driver", 1),
+        Column("points", "Pts", -1, float),
+    ],
+    min_cells=3,
+)
+
+
+def create_table(rows):
+    header = "<tr><th>Pos.</th><th>Driver</th><th>Nationality</th><th>Team</th><th>Pts.</th></tr>"
+    body = "".join(
+        f"<tr><td>{i}</td><td><span>Driver</span> <span>{i}</span></td>"
+        f"<td>FIN</td><td><a href='/team'>Team {i}</a></td><td>{1000 - i}</td></tr>"
+        for i in range(1, rows + 1)
+    )
+    return Selector(text=f"<table>{header}{body}</table>").xpath("//table")
+
+
+def extract_with_parsel(table):
+    standings = []
+    for row in table.xpath(".//tr[position() > 1]"):
+        cells = [td.xpath("string()").get().strip() for td in row.xpath(".//td")]
+        if len(cells) < 3:
+            continue
+        standings.append({"driver": cells[1], "position": cells[0], "points": float(cells[-1])})
+    return standings
+
+
+def extract_with_extractor(table):
+    return [
+        {"driver": driver, "position": position, "points": points}
+        for position, driver, points in EXTRACTOR.extract(table[0])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    table = create_table(args.rows)
+    assert extract_with_parsel(table) == extract_with_extractor(table)
+
+    for name, func in [("parsel", extract_with_parsel), ("extractor", extract_with_extractor)]:
+        seconds = min(timeit.repeat(lambda: func(table), number=1, repeat=args.repeat))
+        print(f"{name.ljust(10)} {seconds * 1e6 / args.rows:8.2f} us/row")
+
+
+if __name__ == "__main__":
+    main()
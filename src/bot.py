@@ -1,21 +1,39 @@
 import os
-import telegram
 from .common.logger import logging
 
 logger = logging.getLogger(__name__)
 
+# Shared across warm invocations to reuse connection to Telegram API
+_bot = None
+
+
+async def get_bot():
+    """
+    Gets initialized bot shared by all invocations of the container
+    """
+    global _bot
+    if _bot is None:
+        bot = Bot()
+        await bot.initialize()
+        _bot = bot
+    return _bot
+
 
 class Bot:
     TELEGRAM_TOKEN = os.environ["TELEGRAM_TOKEN"]
 
     def __init__(self):
+        import telegram
+
         self.tg_bot = telegram.Bot(self.TELEGRAM_TOKEN)
-        self.chat_id = None
 
-    async def send_text(self, text):
+    async def initialize(self):
+        await self.tg_bot.initialize()
+
+    async def send_text(self, chat_id, text):
         try:
             await self.tg_bot.sendMessage(
-                chat_id=self.chat_id,
+                chat_id=chat_id,
                 text=text,
                 parse_mode="MarkdownV2",
                 disable_web_page_preview=True,
@@ -24,10 +42,10 @@ class Bot:
         except Exception:
             logger.exception("Error sending text")
 
-    async def send_image(self, image, caption=""):
+    async def send_image(self, chat_id, image, caption=""):
         try:
             await self.tg_bot.sendPhoto(
-                chat_id=self.chat_id,
+                chat_id=chat_id,
                 photo=image,
                 caption=caption,
                 parse_mode="MarkdownV2",
@@ -36,14 +54,5 @@ class Bot:
         except Exception:
             logger.exception("Error sending image")
 
-    def get_message_text(self, data):
-        try:
-            update = telegram.Update.de_json(data, self.tg_bot)
-            message = update.message
-            self.chat_id = message.chat.id
-            return message.text
-        except Exception:
-            logger.exception("Error getting bot message")
-
     async def set_webhook(self, url):
         return await self.tg_bot.set_webhook(url)
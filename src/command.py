@@ -1,6 +1,14 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
 from enum import Enum
+from .common import deadline
+from .common.background import run_in_background
+from .common.backends import cache_backend
+from .common.cache import TTLCache
 from .common.logger import logging
 from .common.utils import (
+    convert_timezone,
     find_first_integer,
     find_first_word,
     format_as_header,
@@ -10,6 +18,27 @@ from .common.utils import (
 logger = logging.getLogger(__name__)
 
 
+def _response_size(response):
+    size = 256  # rough object overhead
+    if isinstance(response.text, str):
+        size += len(response.text.encode("utf-8"))
+    if isinstance(response.image, str):
+        size += len(response.image)
+    elif response.image is not None:
+        size += response.image.getbuffer().nbytes
+    return size
+
+
+# Rendered replies with the time they were stored, shared across warm invocations
+response_cache = TTLCache(
+    max_entries=256,
+    max_bytes=2 * 1024 * 1024,
+    sizeof=lambda entry: _response_size(entry["response"]),
+)
+# Keys of replies being revalidated in background
+_revalidating = set()
+
+
 class Command:
     AVAILABLE_CMD = "/bot"
     # IMAGE_SEARCH_CMD = "/search"
@@ -20,27 +49,165 @@ class Command:
     NHL_SCORING_CMD = "/nhlscoring"
     NHL_CONTRACT_CMD = "/nhlcontract"
 
-    def __init__(self, text):
+    # Seconds a rendered reply is served from cache
+    CACHE_TTL = {
+        WEATHER_SEARCH_CMD: 10 * 60,
+        F1_RACE_CMD: 60 * 60,
+        F1_STANDINGS_CMD: 60 * 60,
+        F1_RESULTS_CMD: 60 * 60,
+        NHL_SCORING_CMD: 15 * 60,
+        NHL_CONTRACT_CMD: 12 * 60 * 60,
+    }
+    # Stale reply is served while revalidating for as long as it was fresh,
+    # and instead of an error or missing data for this many seconds
+    STALE_IF_ERROR = 6 * 60 * 60
+    CACHE_TIMEZONE = "Europe/Helsinki"
+    # Seconds that must be left for optional parts of a reply such as images
+    ENRICHMENT_BUDGET = 3
+    # Replies precomputed by scheduled refresh
+    PRECOMPUTED_CMDS = (F1_RACE_CMD, F1_STANDINGS_CMD, F1_RESULTS_CMD, NHL_SCORING_CMD)
+
+    def __init__(self, text, timeout=None):
         self.text = text if text is not None else ""
-        self.response = self._command_response()
+        # Seconds the reply has to be ready in, every fetch is bounded by it
+        self.timeout = timeout
+        self.response = None
 
-    def _command_response(self):
+    async def get_response(self):
+        with deadline.limit(self.timeout):
+            return await self._get_response()
+
+    async def _get_response(self):
+        ttl = self._cache_ttl()
+        key = self._cache_key()
+        cached = None
+        if ttl is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                age = time.monotonic() - cached["storedAt"]
+                if age < ttl:
+                    logger.info(f"Response served from cache: {key}")
+                    self.response = cached["response"]
+                    return self.response
+                if age < 2 * ttl:
+                    logger.info(f"Stale response served while revalidating: {key}")
+                    self._revalidate_in_background(key, ttl)
+                    self.response = cached["response"]
+                    return self.response
+            # Reply may have been rendered by refresh or another container
+            stored = await cache_backend.get(f"response:{key}")
+            age = time.time() - stored["storedAt"] if stored is not None else ttl
+            if age < ttl:
+                logger.info(f"Response served from shared cache: {key}")
+                self.response = Response.from_dict(stored)
+                self._remember_response(key, self.response, ttl, age)
+                return self.response
+            if cached is None:
+                # Reply of previous day is never served fresh, only instead of an error
+                cached = response_cache.get(self._cache_key(days_ago=1))
+
+        try:
+            self.response = await self._command_response()
+        except Exception:
+            if cached is None:
+                raise
+            logger.exception(f"Error getting response: {key}")
+            self.response = None
+        if self.response is not None and self.response.cacheable:
+            if ttl is not None:
+                await self._cache_response(key, self.response, ttl)
+        elif cached is not None and (self.response is None or not self.response.partial):
+            # Reply cut short is still newer data, only a failure falls back to stale reply
+            logger.info(f"Stale response served instead of error: {key}")
+            self.response = cached["response"]
+        return self.response
+
+    async def refresh(self):
+        """
+        Computes reply without cache and writes it to shared cache
+        """
+        with deadline.limit(self.timeout):
+            self.response = await self._command_response()
+        ttl = self._cache_ttl()
+        if ttl is None or self.response is None or not self.response.cacheable:
+            return None
+        if self.response.to_dict() is None:
+            return None
+        await self._cache_response(self._cache_key(), self.response, ttl)
+        return self.response
+
+    @staticmethod
+    async def refresh_lookups(timeout=None):
+        """
+        Rebuilds shared data replies only look up, so requests never build it
+        """
+        from .formula.formularace import FormulaRace
+        from .nhl.nhlcontract import NHLContract
+
+        with deadline.limit(timeout):
+            await asyncio.gather(
+                FormulaRace().prefetch_track_images(),
+                NHLContract().refresh_player_index(),
+            )
+
+    async def _cache_response(self, key, response, ttl):
+        self._remember_response(key, response, ttl)
+        data = response.to_dict()
+        if data is not None:
+            await cache_backend.set(f"response:{key}", data | {"storedAt": time.time()}, ttl=ttl)
+
+    def _remember_response(self, key, response, ttl, age=0):
+        response_cache.set(
+            key,
+            {"response": response, "storedAt": time.monotonic() - age},
+            ttl=ttl - age + max(ttl, self.STALE_IF_ERROR),
+        )
+
+    def _revalidate_in_background(self, key, ttl):
+        if key in _revalidating:
+            return
+        _revalidating.add(key)
+        run_in_background(self._revalidate(key, ttl))
+
+    async def _revalidate(self, key, ttl):
+        try:
+            response = await self._command_response()
+            if response is not None and response.cacheable:
+                await self._cache_response(key, response, ttl)
+        except Exception:
+            logger.exception(f"Error revalidating response: {key}")
+        finally:
+            _revalidating.discard(key)
+
+    def _cache_ttl(self):
+        return next(
+            (ttl for cmd, ttl in self.CACHE_TTL.items() if self.text.startswith(cmd)),
+            None,
+        )
+
+    def _cache_key(self, days_ago=0):
+        # Replies depend on current date and season, so they are never fresh across days
+        today = convert_timezone(dt=datetime.now(), target_tz=self.CACHE_TIMEZONE).date()
+        day = today - timedelta(days=days_ago)
+        return f"""{day.isoformat()} {" ".join(self.text.lower().split())}"""
+
+    async def _command_response(self):
         if self.text.startswith(self.AVAILABLE_CMD):
             return self._available_commands()
         # if self.text.startswith(self.IMAGE_SEARCH_CMD):
-        #     return self._search_img()
+        #     return await self._search_img()
         if self.text.startswith(self.WEATHER_SEARCH_CMD):
-            return self._search_weather()
+            return await self._search_weather()
         if self.text.startswith(self.F1_RACE_CMD):
-            return self._formula_race()
+            return await self._formula_race()
         if self.text.startswith(self.F1_STANDINGS_CMD):
-            return self._formula_standings()
+            return await self._formula_standings()
         if self.text.startswith(self.F1_RESULTS_CMD):
-            return self._formula_results()
+            return await self._formula_results()
         if self.text.startswith(self.NHL_SCORING_CMD):
-            return self._nhl_scoring()
+            return await self._nhl_scoring()
         if self.text.startswith(self.NHL_CONTRACT_CMD):
-            return self._nhl_contract()
+            return await self._nhl_contract()
         return None
 
     # Available bot commands
@@ -59,51 +226,59 @@ class Command:
         return Response(text=text)
 
     # Random Google search image by keyword
-    def _search_img(self):
+    async def _search_img(self):
         from .other.imagesearch import ImageSearch
 
         img_search = ImageSearch()
         keyword = self.text.split(self.IMAGE_SEARCH_CMD)[-1].strip()
-        img = img_search.get_random_image(keyword)
+        img = await img_search.get_random_image(keyword)
         if img is not None:
             return Response(image=img, type=ResponseType.IMAGE)
-        return Response(text="No search results available")
+        return Response(text="No search results available", cacheable=False)
 
     # Weather info by location
-    def _search_weather(self):
+    async def _search_weather(self):
         from .other.weathersearch import WeatherSearch
 
         weather_search = WeatherSearch()
         location = self.text.split(self.WEATHER_SEARCH_CMD)[-1].strip()
-        data = weather_search.get_info(location)
+        data = await weather_search.get_info(location)
         if data is not None:
             text = weather_search.format_info(data, location)
+            if not deadline.has_budget(self.ENRICHMENT_BUDGET):
+                logger.info("Weather icon skipped, time is running out")
+                return Response(text=text, partial=True)
             icon = weather_search.get_icon_url(data)
             if icon is not None:
                 return Response(text=text, image=icon, type=ResponseType.IMAGE)
-        return Response(text="No weather data available")
+        return Response(text="No weather data available", cacheable=False)
 
     # F1 upcoming race
-    def _formula_race(self):
+    async def _formula_race(self):
         from .formula.formularace import FormulaRace
 
         formula_race = FormulaRace()
-        data = formula_race.get_upcoming()
+        data = await formula_race.get_upcoming()
         if data is not None:
             text = formula_race.format(data)
-            track_img = formula_race.find_track_image(data["raceUrl"])
+            if not deadline.has_budget(self.ENRICHMENT_BUDGET):
+                logger.info("Track image skipped, time is running out")
+                return Response(text=text, partial=True)
+            track_img = await formula_race.find_track_image(data["raceUrl"])
             if track_img is not None:
                 return Response(text=text, image=track_img, type=ResponseType.IMAGE)
             return Response(text=text)
-        return Response(text="No race info available")
+        return Response(text="No race info available", cacheable=False)
 
     # F1 standings
-    def _formula_standings(self):
+    async def _formula_standings(self):
         from .formula.formulastandings import FormulaStandings
 
         formula_standings = FormulaStandings()
-        team_data = formula_standings.get_team_standings(amount=10)
-        driver_data = formula_standings.get_driver_standings(amount=10)
+        team_data, driver_data = await asyncio.gather(
+            formula_standings.get_team_standings(amount=10),
+            formula_standings.get_driver_standings(amount=10),
+        )
         if (
             team_data is not None
             and team_data["teamStandings"]
@@ -113,20 +288,20 @@ class Command:
             data = team_data | driver_data
             text = formula_standings.format(data)
             return Response(text=text)
-        return Response(text="No standings available")
+        return Response(text="No standings available", cacheable=False)
 
     # F1 latest race results
-    def _formula_results(self):
+    async def _formula_results(self):
         from .formula.formularesults import FormulaResults
 
         formula_results = FormulaResults()
-        data = formula_results.get_results()
+        data = await formula_results.get_results()
         if data is not None and data["results"]:
             text = formula_results.format(data)
             return Response(text=text)
-        return Response(text="No results available")
+        return Response(text="No results available", cacheable=False)
 
-    def _nhl_scoring(self):
+    async def _nhl_scoring(self):
         from .nhl.nhlscoring import NHLScoring
 
         nhl_scoring = NHLScoring()
@@ -134,22 +309,22 @@ class Command:
         team_or_nationality = find_first_word(filters)
         amount = find_first_integer(filters)
         amount = 10 if amount is None else amount
-        data = nhl_scoring.get_scoring_leaders(amount, team_or_nationality)
+        data = await nhl_scoring.get_scoring_leaders(amount, team_or_nationality)
         if data is not None:
             text = nhl_scoring.format(data)
             return Response(text=text)
-        return Response(text="No scoring leaders available")
+        return Response(text="No scoring leaders available", cacheable=False)
 
-    def _nhl_contract(self):
+    async def _nhl_contract(self):
         from .nhl.nhlcontract import NHLContract
 
         nhl_contract = NHLContract()
         player_name = self.text.split(self.NHL_CONTRACT_CMD)[-1].strip().lower()
-        data = nhl_contract.get(player_name)
+        data = await nhl_contract.get(player_name)
         if data is not None:
             text = nhl_contract.format(player_name, data)
             return Response(text=text)
-        return Response(text="No contract available")
+        return Response(text="No contract available", cacheable=False)
 
 
 class ResponseType(Enum):
@@ -158,7 +333,22 @@ class ResponseType(Enum):
 
 
 class Response:
-    def __init__(self, text=None, image=None, type=ResponseType.TEXT):
+    def __init__(
+        self, text=None, image=None, type=ResponseType.TEXT, cacheable=True, partial=False
+    ):
         self.text = text
         self.image = image
         self.type = type
+        # Reply cut short by deadline is served but never stored
+        self.partial = partial
+        self.cacheable = cacheable and not partial
+
+    def to_dict(self):
+        # Uploaded images can't be stored
+        if self.image is not None and not isinstance(self.image, str):
+            return None
+        return {"text": self.text, "image": self.image, "type": self.type.name}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(text=data["text"], image=data["image"], type=ResponseType[data["type"]])
@@ -0,0 +1,364 @@
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+from .cache import TTLCache
+from .logger import logging
+
+logger = logging.getLogger(__name__)
+
+# Bump when cached documents change shape, so old entries are never read
+KEY_VERSION = 1
+KEY_PREFIX = f"telegram-bot:v{KEY_VERSION}:"
+# First byte of every encoded value
+FORMAT_VERSION = 1
+
+
+def encode(value):
+    """
+    Encodes JSON compatible value as compressed bytes prefixed with format version
+    """
+    data = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return bytes([FORMAT_VERSION]) + zlib.compress(data)
+
+
+def decode(data):
+    if not data or data[0] != FORMAT_VERSION:
+        return None
+    return json.loads(zlib.decompress(data[1:]))
+
+
+class CacheBackend(ABC):
+    """
+    Key-value store for JSON compatible values shared by fetchers. Values
+    are encoded to bytes and keys are versioned, so backends only store
+    bytes. Errors are logged and treated as misses, cache is never
+    required for a reply.
+    """
+
+    name = "cache"
+    # Whether values are visible to other containers of the fleet
+    shared = False
+
+    async def get(self, key):
+        try:
+            return decode(await self._get(KEY_PREFIX + key))
+        except Exception:
+            logger.exception(f"Error loading {key} from {self.name} backend")
+
+    async def set(self, key, value, ttl=None):
+        """
+        Stores value, without ttl it's kept until overwritten
+        """
+        try:
+            await self._set(KEY_PREFIX + key, encode(value), ttl)
+        except Exception:
+            logger.exception(f"Error saving {key} to {self.name} backend")
+
+    async def delete(self, key):
+        try:
+            await self._delete(KEY_PREFIX + key)
+        except Exception:
+            logger.exception(f"Error deleting {key} from {self.name} backend")
+
+    @abstractmethod
+    async def _get(self, key):
+        pass
+
+    @abstractmethod
+    async def _set(self, key, data, ttl):
+        pass
+
+    @abstractmethod
+    async def _delete(self, key):
+        pass
+
+
+class MemoryBackend(CacheBackend):
+    """
+    Values kept in process memory, shared only by invocations of the same container
+    """
+
+    name = "memory"
+    MAX_TTL = 365 * 24 * 60 * 60
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024):
+        self.entries = TTLCache(max_entries=max_entries, max_bytes=max_bytes, sizeof=len)
+
+    async def _get(self, key):
+        return self.entries.get(key)
+
+    async def _set(self, key, data, ttl):
+        self.entries.set(key, data, ttl=ttl if ttl is not None else self.MAX_TTL)
+
+    async def _delete(self, key):
+        self.entries.delete(key)
+
+
+def _cache_directory(directory):
+    directory = directory or os.getenv("CACHE_DIR")
+    return Path(directory or tempfile.gettempdir()) / "telegram-bot"
+
+
+class FileBackend(CacheBackend):
+    """
+    Values kept as files in a writable directory, so they survive warm
+    restarts and are shared by containers mounting the same directory.
+    Disk is accessed in a worker thread to keep the event loop free.
+    """
+
+    name = "file"
+    # Expiry time stored in front of encoded value
+    HEADER = struct.Struct(">d")
+    # Seconds between removals of expired files
+    SWEEP_INTERVAL = 10 * 60
+
+    def __init__(self, directory=None):
+        # Default temporary directory is private to the container
+        self.shared = bool(directory or os.getenv("CACHE_DIR"))
+        self.directory = _cache_directory(directory)
+        self._swept_at = 0
+
+    async def _get(self, key):
+        return await asyncio.to_thread(self._read, self._path(key))
+
+    async def _set(self, key, data, ttl):
+        expires = time.time() + ttl if ttl is not None else float("inf")
+        await asyncio.to_thread(self._write, self._path(key), self.HEADER.pack(expires) + data)
+        if time.time() - self._swept_at > self.SWEEP_INTERVAL:
+            self._swept_at = time.time()
+            await asyncio.to_thread(self._sweep)
+
+    async def _delete(self, key):
+        await asyncio.to_thread(self._path(key).unlink, missing_ok=True)
+
+    def _read(self, path):
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        (expires,) = self.HEADER.unpack_from(data)
+        if expires <= time.time():
+            path.unlink(missing_ok=True)
+            return None
+        header_size = self.HEADER.size
+        return data[header_size:]
+
+    def _write(self, path, data):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _sweep(self):
+        """
+        Removes expired files, so keys such as searched locations don't fill the disk
+        """
+        now = time.time()
+        for path in self.directory.glob("*.bin"):
+            try:
+                with open(path, "rb") as f:
+                    (expires,) = self.HEADER.unpack(f.read(self.HEADER.size))
+                if expires <= now:
+                    path.unlink(missing_ok=True)
+            except Exception:
+                logger.exception(f"Error removing expired cache file {path.name}")
+
+    def _path(self, key):
+        return self.directory / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.bin"
+
+
+class SQLiteBackend(CacheBackend):
+    """
+    Values with expiry kept in an SQLite database in a writable directory.
+    Queries run in a worker thread to keep the event loop free.
+    """
+
+    name = "SQLite"
+
+    def __init__(self, directory=None, name="cache"):
+        self.shared = bool(directory or os.getenv("CACHE_DIR"))
+        self.path = _cache_directory(directory) / f"{name}.sqlite3"
+        self._connection = None
+        # Connection is shared by worker threads, one query at a time
+        self._lock = threading.Lock()
+
+    async def _get(self, key):
+        row = await asyncio.to_thread(
+            self._execute, ("SELECT value, expires FROM entries WHERE key = ?", (key,))
+        )
+        if row is None or row[1] <= time.time():
+            return None
+        return row[0]
+
+    async def _set(self, key, data, ttl):
+        now = time.time()
+        expires = now + ttl if ttl is not None else float("inf")
+        await asyncio.to_thread(
+            self._execute,
+            ("DELETE FROM entries WHERE expires <= ?", (now,)),
+            (
+                "INSERT OR REPLACE INTO entries (key, value, expires) VALUES (?, ?, ?)",
+                (key, data, expires),
+            ),
+        )
+
+    async def _delete(self, key):
+        await asyncio.to_thread(self._execute, ("DELETE FROM entries WHERE key = ?", (key,)))
+
+    def _execute(self, *statements):
+        """
+        Runs (sql, parameters) statements in one transaction and gets first row of the last one
+        """
+        with self._lock, self._connect() as connection:
+            for sql, parameters in statements:
+                cursor = connection.execute(sql, parameters)
+            return cursor.fetchone()
+
+    def _connect(self):
+        if self._connection is None:
+            import sqlite3
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+            )
+            connection.commit()
+            self._connection = connection
+        return self._connection
+
+
+class RedisBackend(CacheBackend):
+    """
+    Values kept in a server speaking Redis protocol, shared by every
+    container of the fleet. Commands are sent over one connection that is
+    reopened when the event loop changes or the connection breaks.
+    """
+
+    name = "Redis"
+    shared = True
+
+    def __init__(self, url, timeout=1):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 6379
+        self.password = unquote(parts.password) if parts.password else None
+        self.db = int(parts.path.strip("/") or 0)
+        self.ssl = parts.scheme == "rediss"
+        self.timeout = timeout
+        self._lock = None  # (loop, lock)
+        self._connection = None  # (reader, writer)
+
+    async def _get(self, key):
+        return await self._command("GET", key)
+
+    async def _set(self, key, data, ttl):
+        if ttl is None:
+            await self._command("SET", key, data)
+        elif ttl > 0:
+            await self._command("SET", key, data, "EX", max(1, int(ttl)))
+
+    async def _delete(self, key):
+        await self._command("DEL", key)
+
+    async def _command(self, *args):
+        async with self._get_lock():
+            try:
+                if self._connection is None:
+                    await self._open()
+                return await asyncio.wait_for(self._send(*args), self.timeout)
+            except BaseException:
+                # Reply of an interrupted command would be read by the next one
+                self._close()
+                raise
+
+    def _get_lock(self):
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock[0] is not loop:
+            # Connections are bound to the event loop they were opened on
+            self._connection = None
+            self._lock = (loop, asyncio.Lock())
+        return self._lock[1]
+
+    async def _open(self):
+        self._connection = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl or None), self.timeout
+        )
+        if self.password is not None:
+            await asyncio.wait_for(self._send("AUTH", self.password), self.timeout)
+        if self.db:
+            await asyncio.wait_for(self._send("SELECT", self.db), self.timeout)
+
+    async def _send(self, *args):
+        reader, writer = self._connection
+        writer.write(self._pack(args))
+        await writer.drain()
+        return await self._read_reply(reader)
+
+    def _close(self):
+        if self._connection is not None:
+            self._connection[1].close()
+            self._connection = None
+
+    def _pack(self, args):
+        parts = [f"*{len(args)}\r\n".encode("utf-8")]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode("utf-8")
+            parts += [f"${len(arg)}\r\n".encode("utf-8"), arg, b"\r\n"]
+        return b"".join(parts)
+
+    async def _read_reply(self, reader):
+        line = await reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode("utf-8")
+        if kind == b"-":
+            raise RuntimeError(value.decode("utf-8"))
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            length = int(value)
+            if length < 0:
+                return None
+            return (await reader.readexactly(length + 2))[:-2]
+        if kind == b"*":
+            length = int(value)
+            if length < 0:
+                return None
+            return [await self._read_reply(reader) for _ in range(length)]
+        raise RuntimeError(f"Unknown reply from server: {line!r}")
+
+
+def create_backend(config=None):
+    """
+    Creates backend from config, which is memory, file, sqlite or a redis:// url.
+    Only a Redis server, or file and sqlite in a CACHE_DIR every container
+    mounts, share values across the fleet. Without config values are kept
+    in files of the temporary directory, which survive warm restarts of the
+    container.
+    """
+    config = config or os.getenv("CACHE_BACKEND") or "file"
+    if config.startswith(("redis://", "rediss://")):
+        return RedisBackend(config)
+    backends = {"memory": MemoryBackend, "file": FileBackend, "sqlite": SQLiteBackend}
+    if config not in backends:
+        raise ValueError(f"Unknown cache backend {config}")
+    return backends[config]()
+
+
+cache_backend = create_backend()
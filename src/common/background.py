@@ -0,0 +1,32 @@
+import asyncio
+from .logger import logging
+
+logger = logging.getLogger(__name__)
+
+# Strong references so pending tasks are not garbage collected
+_tasks = set()
+
+
+def run_in_background(coro, context=None):
+    """
+    Starts coroutine as a task that handler drains before returning, in
+    given context or a copy of the current one
+    """
+    task = asyncio.get_running_loop().create_task(coro, context=context)
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
+
+
+async def drain(timeout):
+    """
+    Waits for background tasks at most timeout seconds and gets the number
+    of tasks still pending. Pending tasks are not cancelled, they continue
+    on the next invocation of a warm container.
+    """
+    if not _tasks or timeout <= 0:
+        return len(_tasks)
+    _, still_pending = await asyncio.wait(set(_tasks), timeout=timeout)
+    if still_pending:
+        logger.info(f"{len(still_pending)} background tasks still pending")
+    return len(still_pending)
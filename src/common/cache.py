@@ -0,0 +1,232 @@
+import sys
+import time
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+
+
+class TTLCache:
+    """
+    Bounded LRU cache where every entry has its own time-to-live.
+    Least recently used entries are evicted when either entry count or
+    approximate memory use exceeds its limit.
+    """
+
+    def __init__(self, max_entries=128, max_bytes=1024 * 1024, ttl=60, sizeof=None, clock=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof if sizeof is not None else sys.getsizeof
+        self.clock = clock if clock is not None else time.monotonic
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries = OrderedDict()  # key -> (expires, size, value)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        entry = self._entries.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def get(self, key, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        if entry[0] <= self.clock():
+            self._remove(key)
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[2]
+
+    def set(self, key, value, ttl=None):
+        ttl = ttl if ttl is not None else self.ttl
+        size = self.sizeof(value)
+        if ttl <= 0 or size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self.clock() + ttl, size, value)
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self.bytes -= size
+
+
+class HTTPCache:
+    """
+    Private HTTP cache following RFC 9111 freshness and validation rules.
+    Stores response bodies with their validators, so fresh entries can be
+    served without network and stale ones revalidated conditionally.
+    """
+
+    HEURISTIC_FRACTION = 0.1
+    HEURISTIC_MAX_LIFETIME = 60 * 60
+    # Headers describing the transferred body, not the decoded one kept here
+    SKIPPED_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+    CONDITIONAL_HEADERS = {"if-none-match", "if-modified-since"}
+
+    def __init__(self, max_entries=128, max_bytes=8 * 1024 * 1024, max_stale=24 * 60 * 60):
+        self.entries = TTLCache(
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl=max_stale,
+            sizeof=lambda entry: len(entry["content"]) + 512,
+        )
+
+    def lookup(self, url, request_headers):
+        """
+        Gets stored entry for request or None if the request must bypass cache
+        """
+        if not self._is_cacheable_request(request_headers):
+            return None
+        entry = self.entries.get(url)
+        if entry is None:
+            return None
+        for name, value in entry["vary"].items():
+            if request_headers.get(name) != value:
+                return None
+        return entry
+
+    def is_fresh(self, entry):
+        if entry["noCache"]:
+            return False
+        age = entry["age"] + max(0, time.time() - entry["storedAt"])
+        return age < entry["lifetime"]
+
+    def validators(self, entry):
+        headers = {}
+        if "etag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if "last-modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    def store(self, url, request_headers, response_headers, content):
+        """
+        Stores response if its headers allow it and returns the stored entry
+        """
+        entry = self._create_entry(request_headers, response_headers, content)
+        if entry is None:
+            return None
+        self.entries.set(url, entry)
+        return entry
+
+    def is_storable(self, request_headers, response_headers):
+        """
+        Checks if response would be stored before its body has been read
+        """
+        return self._create_entry(request_headers, response_headers, b"") is not None
+
+    def revalidated(self, url, entry, response_headers):
+        """
+        Updates entry with headers of a 304 response and stores it again
+        """
+        entry["headers"].update(
+            (name.lower(), value)
+            for name, value in response_headers.items()
+            if name.lower() not in self.SKIPPED_HEADERS
+        )
+        self._refresh(entry)
+        self.entries.set(url, entry)
+        return entry
+
+    def _create_entry(self, request_headers, response_headers, content):
+        if not self._is_cacheable_request(request_headers):
+            return None
+        headers = {
+            name.lower(): value
+            for name, value in response_headers.items()
+            if name.lower() not in self.SKIPPED_HEADERS
+        }
+        cache_control = parse_cache_control(headers.get("cache-control"))
+        vary = [name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()]
+        if "no-store" in cache_control or "*" in vary:
+            return None
+        entry = {
+            "headers": headers,
+            "content": content,
+            "vary": {name: request_headers.get(name) for name in vary},
+        }
+        self._refresh(entry)
+        if entry["lifetime"] <= 0 and not self.validators(entry):
+            return None
+        return entry
+
+    def _refresh(self, entry):
+        headers = entry["headers"]
+        cache_control = parse_cache_control(headers.get("cache-control"))
+        entry["storedAt"] = time.time()
+        entry["age"] = _parse_int(headers.get("age"), 0)
+        entry["noCache"] = "no-cache" in cache_control
+        entry["lifetime"] = self._freshness_lifetime(headers, cache_control)
+
+    def _freshness_lifetime(self, headers, cache_control):
+        if "max-age" in cache_control:
+            return _parse_int(cache_control["max-age"], 0)
+        date = _parse_http_date(headers.get("date"))
+        if "expires" in headers:
+            expires = _parse_http_date(headers["expires"])
+            if expires is None or date is None:
+                return 0
+            return max(0, (expires - date).total_seconds())
+        last_modified = _parse_http_date(headers.get("last-modified"))
+        if date is not None and last_modified is not None:
+            heuristic = (date - last_modified).total_seconds() * self.HEURISTIC_FRACTION
+            return max(0, min(heuristic, self.HEURISTIC_MAX_LIFETIME))
+        return 0
+
+    def _is_cacheable_request(self, request_headers):
+        if any(name in self.CONDITIONAL_HEADERS for name in request_headers):
+            # Caller manages validators itself
+            return False
+        return "no-store" not in parse_cache_control(request_headers.get("cache-control"))
+
+
+def parse_cache_control(value):
+    directives = {}
+    for directive in (value or "").split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def _parse_int(value, default):
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def _parse_http_date(value):
+    if value is None:
+        return None
+    try:
+        return parsedate_to_datetime(value)
+    except ValueError:
+        return None
@@ -0,0 +1,69 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+
+# Monotonic time the current invocation has to be done by, None when unbounded
+_deadline = ContextVar("deadline", default=None)
+
+
+@contextmanager
+def limit(seconds):
+    """
+    Bounds code in the block and tasks started from it to given seconds,
+    a nested deadline can only shorten the outer one
+    """
+    if seconds is None:
+        yield
+        return
+    current = _deadline.get()
+    new = time.monotonic() + seconds
+    token = _deadline.set(new if current is None else min(current, new))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """
+    Gets seconds left until deadline or None without deadline
+    """
+    current = _deadline.get()
+    if current is None:
+        return None
+    return max(0.0, current - time.monotonic())
+
+
+def timeout(default):
+    """
+    Gets timeout for a single call, the default capped to time left
+    """
+    left = remaining()
+    return default if left is None else min(default, left)
+
+
+def has_budget(seconds):
+    left = remaining()
+    return left is None or left >= seconds
+
+
+async def bounded(awaitable):
+    """
+    Awaits at most until deadline, timeouts of single operations don't
+    bound a slow response as a whole
+    """
+    left = remaining()
+    if left is None:
+        return await awaitable
+    return await asyncio.wait_for(awaitable, left)
+
+
+def detached():
+    """
+    Gets copy of current context without deadline, for work shared by
+    callers that each have their own deadline
+    """
+    context = copy_context()
+    context.run(_deadline.set, None)
+    return context
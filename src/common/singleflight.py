@@ -0,0 +1,53 @@
+import asyncio
+from . import deadline
+from .logger import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key, so callers arriving
+    while a call is in flight await its result instead of calling again
+    """
+
+    def __init__(self, name, describe=str):
+        self.name = name
+        # Gets key as logged, keys holding secrets are described without them
+        self.describe = describe
+        self.flights = 0
+        self.callers = 0
+        self._flights = {}  # key -> {"task": task, "callers": count}
+
+    def __len__(self):
+        return len(self._flights)
+
+    async def do(self, key, func, *args, **kwargs):
+        """
+        Gets result of func, which is called only if no call with the key is in flight
+        """
+        flight = self._flights.get(key)
+        loop = asyncio.get_running_loop()
+        if flight is None or flight["task"].get_loop() is not loop:
+            # Call isn't bound by deadline of the caller starting it, every
+            # caller waits for it only until its own deadline
+            task = loop.create_task(func(*args, **kwargs), context=deadline.detached())
+            flight = {"task": task, "callers": 0}
+            self._flights[key] = flight
+            task.add_done_callback(lambda _: self._land(key, flight))
+        flight["callers"] += 1
+        # One cancelled caller doesn't cancel the call others are waiting
+        return await deadline.bounded(asyncio.shield(flight["task"]))
+
+    def stats(self):
+        return {"flights": self.flights, "callers": self.callers, "inFlight": len(self._flights)}
+
+    def _land(self, key, flight):
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        self.flights += 1
+        self.callers += flight["callers"]
+        if flight["callers"] > 1:
+            logger.info(
+                f"{self.name} flight served {flight['callers']} callers: {self.describe(key)}"
+            )
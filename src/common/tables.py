@@ -0,0 +1,81 @@
+import re
+from collections import namedtuple
+
+# Column is found by header text prefix and falls back to cell index
+Column = namedtuple("Column", ["name", "header", "index", "type"], defaults=[None, None, str])
+
+_xpaths = {}
+
+
+def _xpath(path):
+    """
+    Gets compiled XPath, lxml is imported only when a table is extracted
+    """
+    if path not in _xpaths:
+        from lxml import etree
+
+        _xpaths[path] = etree.XPath(path)
+    return _xpaths[path]
+
+
+def _normalize_header(text):
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+class TableExtractor:
+    """
+    Extracts rows of an HTML table into typed tuples in column order.
+    XPath expressions are compiled once and only the cells of mapped
+    columns are read from each row.
+    """
+
+    def __init__(self, columns, skip_header=True, skip_footer=False, min_cells=1):
+        self.columns = columns
+        self.skip_header = skip_header
+        self.skip_footer = skip_footer
+        self.min_cells = min_cells
+
+    def extract(self, table):
+        """
+        Gets rows of table given as parsel selector or lxml element
+        """
+        root = getattr(table, "root", table)
+        rows = _xpath(".//tr")(root)
+        header = rows[0] if rows and self.skip_header else None
+        rows = rows[1:] if self.skip_header else rows
+        rows = rows[:-1] if self.skip_footer else rows
+
+        string, cells = _xpath("string()"), _xpath("./td")
+        indexes = self._map_columns(header)
+        min_cells = max([self.min_cells] + [i + 1 if i >= 0 else -i for i in indexes])
+        results = []
+        for row in rows:
+            row_cells = cells(row)
+            if len(row_cells) < min_cells:
+                continue
+            results.append(
+                tuple(
+                    column.type(string(row_cells[index]).strip())
+                    for column, index in zip(self.columns, indexes)
+                )
+            )
+        return results
+
+    def _map_columns(self, header):
+        headers = []
+        if header is not None:
+            string = _xpath("string()")
+            headers = [_normalize_header(string(cell)) for cell in _xpath("./th | ./td")(header)]
+        indexes = []
+        for column in self.columns:
+            index = column.index
+            if column.header is not None:
+                prefix = _normalize_header(column.header)
+                index = next(
+                    (i for i, text in enumerate(headers) if text and text.startswith(prefix)),
+                    index,
+                )
+            if index is None:
+                raise ValueError(f"Column {column.name} not found from table header")
+            indexes.append(index)
+        return indexes
@@ -1,23 +1,324 @@
-import httpx
+import asyncio
+import importlib.util
 import re
+from contextlib import aclosing
+from urllib.parse import urlsplit
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from http import HTTPStatus
-from parsel import Selector
+from . import deadline
+from .background import run_in_background
+from .cache import HTTPCache
+from .singleflight import SingleFlight
 
+# httpx and parsel are imported where needed to keep them off the cold start path
+HTTP2_ENABLED = importlib.util.find_spec("h2") is not None
+# Seconds for each connect, read and write, capped to time left before deadline
+REQUEST_TIMEOUT = 5
 
-def get(url, params=None):
-    with httpx.Client() as client:
-        res = client.get(url, params=params, follow_redirects=True)
-        if res.status_code == HTTPStatus.OK:
-            return res
+# One pooled client per upstream host, kept alive across warm invocations
+_clients = {}
+_clients_loop = None
+
+http_cache = HTTPCache()
+
+
+def _describe_flight(key):
+    """
+    Gets flight key as logged, query string and headers may hold API keys
+    """
+    kind, url = key[:2]
+    parts = urlsplit(url)
+    return f"{kind} {parts.hostname}{parts.path}"
+
+
+# Concurrent identical requests share one upstream call
+http_flights = SingleFlight("HTTP", describe=_describe_flight)
+# Streamed bodies being read by url, concurrent callers follow the same read
+_bodies = {}
+
+
+def get_client(url):
+    """
+    Gets pooled client for the host of given url
+    """
+    global _clients_loop
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    if loop is not _clients_loop:
+        # Connections are bound to the event loop they were opened on
+        _clients.clear()
+        _clients_loop = loop
+    host = httpx.URL(url).host
+    client = _clients.get(host)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=10,
+                max_keepalive_connections=5,
+                keepalive_expiry=60,
+            ),
+            follow_redirects=True,
+        )
+        _clients[host] = client
+    return client
+
+
+async def get(url, params=None, headers=None):
+    import httpx
+
+    # Fails fast without time left, flight itself isn't bound by caller deadline
+    _request_timeout(url)
+    req = httpx.Request("GET", url, params=params, headers=headers)
+    flight_key = ("get", str(req.url), tuple(sorted((headers or {}).items())))
+    # Callers of a flight share only immutable data, each gets its own response
+    status_code, res_headers, content = await http_flights.do(
+        flight_key, _send, url, params, headers
+    )
+    return _create_response(status_code, res_headers, content, req)
+
+
+async def _send(url, params, headers):
+    """
+    Gets (status code, headers, content) for request from cache or upstream
+    """
+    client = get_client(url)
+    timeout = _request_timeout(url)
+    req = client.build_request("GET", url, params=params, headers=headers, timeout=timeout)
+    key = str(req.url)
+    req_headers = req.headers.copy()
+    entry = http_cache.lookup(key, req_headers)
+    if entry is not None:
+        if http_cache.is_fresh(entry):
+            return _cached_result(entry)
+        req.headers.update(http_cache.validators(entry))
+
+    res = await client.send(req)
+    if res.status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+        entry = http_cache.revalidated(key, entry, res.headers)
+        return _cached_result(entry)
+    if res.status_code == HTTPStatus.OK:
+        http_cache.store(key, req_headers, res.headers, res.content)
+    elif res.status_code != HTTPStatus.NOT_MODIFIED:
         res.raise_for_status()
+    # Content is already decoded, so headers describing the transfer are dropped
+    res_headers = tuple(
+        (name, value)
+        for name, value in res.headers.multi_items()
+        if name.lower() not in HTTPCache.SKIPPED_HEADERS
+    )
+    return res.status_code, res_headers, res.content
+
+
+def _request_timeout(url):
+    timeout = deadline.timeout(REQUEST_TIMEOUT)
+    if timeout <= 0:
+        raise TimeoutError(f"No time left for request to {url}")
+    return timeout
+
+
+def _cached_result(entry):
+    return HTTPStatus.OK, tuple(entry["headers"].items()), entry["content"]
+
+
+def _create_response(status_code, headers, content, req):
+    import httpx
+
+    return httpx.Response(status_code, headers=headers, content=content, request=req)
+
+
+async def set_selector(url, target_encoding="latin-1"):
+    return await http_flights.do(
+        ("selector", url, target_encoding), _set_selector, url, target_encoding
+    )
+
+
+async def _set_selector(url, target_encoding):
+    from parsel import Selector
+
+    res = await get(url)
+    return Selector(text=res.content.decode(target_encoding, errors="replace"))
+
+
+async def stream_elements(url, tag, id=None, classes=None, encoding="utf-8"):
+    """
+    Yields selectors for elements matching tag, id and classes as soon as
+    each element has been closed. Response is parsed incrementally and
+    parsing stops when caller stops iterating, so wrap this in
+    contextlib.aclosing when breaking out early. Concurrent callers of the
+    same url share one read, and rest of a cacheable body is read in
+    background, so the page can be served from HTTP cache.
+    """
+    from lxml import etree
+    from parsel import Selector
+
+    parser = etree.HTMLPullParser(events=("start", "end"), encoding=encoding)
+    matcher = _ElementMatcher(tag, id, classes)
+    async with aclosing(_iter_body(url)) as body:
+        async for chunk in body:
+            parser.feed(chunk)
+            for element in matcher.read(parser):
+                yield Selector(root=element)
+    parser.close()
+    for element in matcher.read(parser):
+        yield Selector(root=element)
+
+
+async def find_element(url, tag, id=None, classes=None, encoding="utf-8"):
+    """
+    Gets selector for the first matching element or None
+    """
+    async with aclosing(stream_elements(url, tag, id, classes, encoding)) as elements:
+        return await anext(elements, None)
+
+
+async def _iter_body(url):
+    import httpx
+
+    key = str(httpx.URL(url))
+    entry = http_cache.lookup(key, {})
+    if entry is not None and http_cache.is_fresh(entry):
+        yield entry["content"]
+        return
+    # Fails fast without time left, read itself isn't bound by caller deadline
+    _request_timeout(url)
+    body = _bodies.get(key)
+    if body is None:
+        body = _bodies[key] = _SharedBody()
+        body.task = run_in_background(
+            _read_body(key, url, entry, body), context=deadline.detached()
+        )
+        body.task.add_done_callback(lambda _: _forget_body(key, body))
+    body.readers += 1
+    try:
+        index = 0
+        # Every wait is bounded by time left instead of one timeout around the
+        # generator, which would cancel whatever the caller awaits between chunks
+        while (chunk := await deadline.bounded(body.chunk(index))) is not None:
+            index += 1
+            yield chunk
+    finally:
+        body.readers -= 1
+        if not body.readers and not body.storable:
+            # Rest of a body that can't be cached isn't needed by anyone
+            _forget_body(key, body)
+            body.task.cancel()
+
+
+async def _read_body(key, url, entry, body):
+    """
+    Reads streamed response of url into shared body and stores it in HTTP
+    cache, body that can't be stored is read only as fast as callers need it
+    """
+    try:
+        client = get_client(url)
+        headers = http_cache.validators(entry) if entry is not None else None
+        req = client.build_request("GET", url, headers=headers, timeout=_request_timeout(url))
+        res = await client.send(req, stream=True)
+        try:
+            if res.status_code == HTTPStatus.NOT_MODIFIED and entry is not None:
+                body.append(http_cache.revalidated(key, entry, res.headers)["content"])
+            else:
+                if res.status_code != HTTPStatus.OK:
+                    res.raise_for_status()
+                body.storable = http_cache.is_storable({}, res.headers)
+                async for chunk in res.aiter_bytes():
+                    body.append(chunk)
+                    await body.wanted()
+                if body.storable:
+                    http_cache.store(key, {}, res.headers, b"".join(body.chunks))
+        finally:
+            await res.aclose()
+        body.finish()
+    except Exception as e:
+        body.finish(e)
+
+
+def _forget_body(key, body):
+    if _bodies.get(key) is body:
+        del _bodies[key]
+
+
+class _SharedBody:
+    """
+    Chunks of one streamed response followed by every concurrent caller
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.readers = 0
+        self.storable = False
+        self.task = None
+        self._done = False
+        self._error = None
+        self._changed = asyncio.Event()
+        self._wanted = asyncio.Event()
+
+    async def chunk(self, index):
+        """
+        Gets chunk at index once it has been read or None after the last one
+        """
+        while index >= len(self.chunks) and not self._done:
+            self._wanted.set()
+            await self._changed.wait()
+        if index < len(self.chunks):
+            return self.chunks[index]
+        if self._error is not None:
+            raise self._error
+        return None
+
+    async def wanted(self):
+        """
+        Waits until a caller needs the next chunk, unless body is read to be stored
+        """
+        if not self.storable:
+            await self._wanted.wait()
+
+    def append(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error=None):
+        self._done = True
+        self._error = error
+        self._notify()
+
+    def _notify(self):
+        self._wanted.clear()
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+
+class _ElementMatcher:
+    def __init__(self, tag, id=None, classes=None):
+        self.tag = tag
+        self.id = id
+        self.classes = set(classes or ())
+        self.target = None
 
+    def read(self, parser):
+        """
+        Yields matching elements completed by events read from parser
+        """
+        for event, element in parser.read_events():
+            if event == "start":
+                if self.target is None and self._matches(element):
+                    self.target = element
+            elif element is self.target:
+                self.target = None
+                yield element
+            elif self.target is None:
+                # Parsed content outside of targets isn't needed anymore
+                element.clear(keep_tail=True)
 
-def set_selector(url, target_encoding="latin-1"):
-    res = get(url)
-    res.encoding = target_encoding
-    return Selector(text=res.text)
+    def _matches(self, element):
+        return (
+            element.tag == self.tag
+            and (self.id is None or element.get("id") == self.id)
+            and self.classes <= set(element.get("class", "").split())
+        )
 
 
 def find_first_integer(strings):
@@ -5,10 +5,10 @@ from datetime import datetime
 class FormulaBase:
     CALENDAR_URL = os.getenv("F1_CALENDAR_URL")
 
-    def __init__(self, date=datetime.now()):
+    def __init__(self, date=None):
         self.base_url = "https://www.formula1.com"
         self.calendar = self.CALENDAR_URL
-        self.date = date
+        self.date = date if date is not None else datetime.now()
         self.source_timezone = "Etc/UTC"
         self.source_datetime_pattern = "%Y%m%dT%H%M%S"
         self.target_date_pattern = "%b %d"
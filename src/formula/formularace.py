@@ -1,9 +1,14 @@
+import asyncio
 import re
+import time
 import unicodedata
 from datetime import datetime
+from http import HTTPStatus
 from zoneinfo import ZoneInfo
-from icalendar import Calendar
 from .formulabase import FormulaBase
+from .formulaseason import RaceSeason
+from ..common.background import run_in_background
+from ..common.backends import cache_backend
 from ..common.logger import logging
 from ..common.utils import (
     format_as_monospace,
@@ -18,29 +23,48 @@ from ..common.utils import (
 
 logger = logging.getLogger(__name__)
 
+# Parsed race weekends with validators of the calendar feed they came from
+_calendar_cache = {}
+# Track image urls by race url and times of pages found without one, by season
+_track_images = {}
+
 
 class FormulaRace(FormulaBase):
+    # Calendar checked this recently is used without revalidation
+    CALENDAR_MAX_AGE = 60 * 60
+    TRACK_IMAGE_CONCURRENCY = 6
+    # Seconds a race page without track image isn't fetched again
+    TRACK_IMAGE_MISS_TTL = 6 * 60 * 60
+
     def __init__(self):
         super().__init__()
 
-    def get_upcoming(self):
+    async def get_upcoming(self):
         """
         Gets info for the upcoming race
         """
         try:
-            race_weekends = self._get_race_weekends()
-            race = next(
-                (
-                    race
-                    for race in race_weekends
-                    if "race" in race["sessions"] and race["sessions"]["race"] >= self.date
-                ),
-                race_weekends[-1],
-            )
-            return race
+            season = await self.get_season()
+            if season is None:
+                return None
+            return season.next_race(self.date)
         except Exception:
             logger.exception(f"Error getting upcoming race for year {self.date.year}")
 
+    async def get_season(self):
+        """
+        Gets indexed season model, built once per parsed calendar
+        """
+        race_weekends = await self._get_race_weekends()
+        if not race_weekends:
+            return None
+        cached = _calendar_cache.get(self.calendar)
+        if cached is None or cached["raceWeekends"] is not race_weekends:
+            return RaceSeason(race_weekends)
+        if "season" not in cached:
+            cached["season"] = RaceSeason(race_weekends)
+        return cached["season"]
+
     def format(self, data):
         header = "Upcoming race:"
         sessions = dict(sorted(data["sessions"].items(), key=lambda x: x[1]))
@@ -63,28 +87,108 @@ class FormulaRace(FormulaBase):
         )
         return text
 
-    def find_track_image(self, url):
+    async def find_track_image(self, url):
         """
-        Gets image for race track
+        Gets image for race track, images of other races are prefetched in background
         """
         try:
-            selector = set_selector(url, "utf8")
-            img_urls = selector.xpath(
-                "//img[contains(translate(@alt, 'PNG', 'png'), '.png')]/@src"
-            ).getall()
-            img_url = next(src for src in img_urls if "track" in src.lower())
-            return self._add_timestamp_to_image(img_url)
+            track_images = await self._load_track_images()
+            if url not in track_images["images"] and not self._is_known_miss(track_images, url):
+                await self._find_track_images([url])
+                run_in_background(self.prefetch_track_images())
+            img_url = track_images["images"].get(url)
+            if img_url is None:
+                return None
+            return self._add_season_to_image(img_url)
         except Exception:
             logger.exception("Error getting track image")
 
-    def _add_timestamp_to_image(self, img):
+    async def prefetch_track_images(self):
+        """
+        Finds track images for every race weekend of the season not yet looked up
+        """
+        try:
+            season = await self.get_season()
+            if season is None:
+                return
+            track_images = await self._load_track_images()
+            urls = dict.fromkeys(rw["raceUrl"] for rw in season.race_weekends)
+            missing = [
+                url
+                for url in urls
+                if url not in track_images["images"] and not self._is_known_miss(track_images, url)
+            ]
+            if missing:
+                await self._find_track_images(missing)
+        except Exception:
+            logger.exception(f"Error prefetching track images for year {self.date.year}")
+
+    async def _find_track_images(self, urls):
+        track_images = await self._load_track_images()
+        semaphore = asyncio.Semaphore(self.TRACK_IMAGE_CONCURRENCY)
+
+        async def fetch(url):
+            async with semaphore:
+                return await self._fetch_track_image(url)
+
+        found = await asyncio.gather(*(fetch(url) for url in urls), return_exceptions=True)
+        for url, img_url in zip(urls, found):
+            if isinstance(img_url, Exception):
+                # Failed lookups are retried, only pages without image are remembered
+                logger.error(f"Error getting track image with url {url}", exc_info=img_url)
+            elif img_url is None:
+                track_images["missing"][url] = time.time()
+            else:
+                track_images["images"][url] = img_url
+                track_images["missing"].pop(url, None)
+        await cache_backend.set(f"f1_track_images:{self.date.year}", track_images)
+
+    async def _fetch_track_image(self, url):
+        selector = await set_selector(url, "utf8")
+        img_urls = selector.xpath(
+            "//img[contains(translate(@alt, 'PNG', 'png'), '.png')]/@src"
+        ).getall()
+        return next((src for src in img_urls if "track" in src.lower()), None)
+
+    async def _load_track_images(self):
+        year = self.date.year
+        if year not in _track_images:
+            stored = await cache_backend.get(f"f1_track_images:{year}")
+            _track_images[year] = stored or {"images": {}, "missing": {}}
+        return _track_images[year]
+
+    def _is_known_miss(self, track_images, url):
+        checked_at = track_images["missing"].get(url)
+        return checked_at is not None and time.time() - checked_at < self.TRACK_IMAGE_MISS_TTL
+
+    def _add_season_to_image(self, img):
+        # Telegram caches images by url, so images of the previous season
+        # with the same url are busted once per season
         if isinstance(img, str):
-            return f"{img}?a={datetime.now().isoformat()}"
+            return f"{img}?a={self.date.year}"
         return img
 
-    def _get_race_weekends(self):
+    async def _get_race_weekends(self):
+        from icalendar import Calendar
+
         try:
-            res = get(self.calendar)
+            cached = await self._load_calendar_cache()
+            if cached is not None and time.time() - cached["checkedAt"] < self.CALENDAR_MAX_AGE:
+                return cached["raceWeekends"]
+            headers = {}
+            if cached is not None:
+                if cached["etag"]:
+                    headers["If-None-Match"] = cached["etag"]
+                if cached["lastModified"]:
+                    headers["If-Modified-Since"] = cached["lastModified"]
+
+            res = await get(self.calendar, headers=headers)
+            if res.status_code == HTTPStatus.NOT_MODIFIED and cached is not None:
+                await self._save_calendar_cache(
+                    cached["raceWeekends"], cached["etag"], cached["lastModified"]
+                )
+                return cached["raceWeekends"]
+
             calendar = Calendar.from_ical(res.content)
             events = [self._event_to_dict(event) for event in calendar.walk("VEVENT")]
             if not events:
@@ -94,33 +198,99 @@ class FormulaRace(FormulaBase):
             if not race_weekends:
                 logger.info(f"No race weekends available for year {self.date.year}")
                 return
+            await self._save_calendar_cache(
+                race_weekends,
+                etag=res.headers.get("ETag"),
+                last_modified=res.headers.get("Last-Modified"),
+            )
             return race_weekends
         except Exception:
             logger.exception(f"Error getting calendar data with url {self.calendar}")
 
+    async def _load_calendar_cache(self):
+        cached = _calendar_cache.get(self.calendar)
+        if cached is not None:
+            return cached
+        stored = await cache_backend.get("f1_calendar")
+        if stored is None or stored["url"] != self.calendar:
+            return None
+        cached = {
+            "etag": stored["etag"],
+            "lastModified": stored["lastModified"],
+            "raceWeekends": self._deserialize_race_weekends(stored["raceWeekends"]),
+            "checkedAt": stored["checkedAt"],
+        }
+        _calendar_cache[self.calendar] = cached
+        return cached
+
+    async def _save_calendar_cache(self, race_weekends, etag=None, last_modified=None):
+        # Calendar without validators is still kept for max age, only refetched in full
+        cached = _calendar_cache.get(self.calendar)
+        if cached is None or cached["raceWeekends"] is not race_weekends:
+            cached = {"etag": etag, "lastModified": last_modified, "raceWeekends": race_weekends}
+            _calendar_cache[self.calendar] = cached
+        # Other containers skip revalidation while the check is recent
+        cached["checkedAt"] = time.time()
+        await cache_backend.set(
+            "f1_calendar",
+            {
+                "url": self.calendar,
+                "etag": etag,
+                "lastModified": last_modified,
+                "checkedAt": cached["checkedAt"],
+                "raceWeekends": self._serialize_race_weekends(race_weekends),
+            },
+        )
+
+    def _serialize_race_weekends(self, race_weekends):
+        return [
+            [
+                rw["name"],
+                rw["raceUrl"],
+                rw["location"],
+                rw["round"],
+                {
+                    session: date.strftime(self.source_datetime_pattern)
+                    for session, date in rw["sessions"].items()
+                },
+            ]
+            for rw in race_weekends
+        ]
+
+    def _deserialize_race_weekends(self, data):
+        return [
+            {
+                "name": name,
+                "raceUrl": race_url,
+                "location": location,
+                "round": round_number,
+                "sessions": {
+                    session: text_to_datetime(date, self.source_datetime_pattern)
+                    for session, date in sessions.items()
+                },
+            }
+            for name, race_url, location, round_number, sessions in data
+        ]
+
     def _events_to_race_weekends(self, events):
         """
         Parse and combine scheduled events to race weekends
         """
         events = sorted(self._filter_events(events), key=lambda x: x["startTime"])
-        race_weekends = []
+        race_weekends = {}
         for event in events:
-            if any(rw["name"] == event["name"] for rw in race_weekends):
-                for rw in race_weekends:
-                    if rw["name"] == event["name"]:
-                        rw["sessions"][event["session"]] = self._format_date_utc(event["startTime"])
-            else:
+            race_weekend = race_weekends.get(event["name"])
+            if race_weekend is None:
                 race_weekend = {
                     "name": event["name"],
                     "raceUrl": self._find_race_url(event["description"]),
                     "location": event["location"],
-                    "sessions": {event["session"]: self._format_date_utc(event["startTime"])},
+                    "sessions": {},
+                    "round": len(race_weekends) + 1,
                 }
-                race_weekends.append(race_weekend)
-
-        for index, race_weekend in enumerate(race_weekends):
-            race_weekend["round"] = index + 1
-        return race_weekends
+                race_weekends[event["name"]] = race_weekend
+            race_weekend["sessions"][event["session"]] = self._format_date_utc(event["startTime"])
+        return list(race_weekends.values())
 
     def _event_to_dict(self, event):
         summary = self._normalize_text_encoding(event["SUMMARY"])
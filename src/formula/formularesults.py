@@ -1,69 +1,154 @@
+from datetime import timedelta
 from .formulabase import FormulaBase
+from .formularace import FormulaRace
+from ..common.backends import cache_backend
+from ..common.cache import TTLCache
 from ..common.logger import logging
+from ..common.singleflight import SingleFlight
+from ..common.tables import Column, TableExtractor
 from ..common.utils import (
     format_as_monospace,
     format_as_header,
     format_as_url,
-    set_selector,
+    find_element,
 )
 
 logger = logging.getLogger(__name__)
 
+# Results of ingested rounds by season
+_results = {}
+# Burst of requests after a race shares one ingestion
+_results_flights = SingleFlight("F1 results")
+# Rounds by season whose results were not published when last checked
+_unpublished_rounds = TTLCache(max_entries=32, ttl=5 * 60)
+
+RESULTS_TABLE = TableExtractor(
+    [
+        Column("position", "Pos", 0),
+        Column("name", "Driver", 2),
+        Column("time", "Time", -2),
+    ],
+    skip_footer=True,
+    min_cells=4,
+)
+
 
 class FormulaResults(FormulaBase):
+    # Results are published after the race has ended
+    RACE_DURATION = timedelta(hours=3)
+
     def __init__(self):
         super().__init__()
 
-    def get_results(self, amount=10):
+    async def get_results(self, amount=10):
         """
-        Gets top drivers from the latest race and url for more details
+        Gets top drivers from the latest race and url for more details.
+        Results page is fetched only when the calendar has a completed
+        round that has not been ingested yet.
         """
-        url = f"{self.base_url}/en/results/{self.date.year}/races"
         try:
-            selector = set_selector(url, "utf8")
-            races_table = selector.xpath("//div[@id='results-table']//table")
-
-            if not races_table:
-                logger.info(f"Races table not found for year {self.date.year}")
-                return
-
-            race_links = races_table.xpath(".//a[@href]/@href").getall()
-
-            if not race_links:
-                logger.info(f"No past races found for year {self.date.year}")
+            data = await _results_flights.do(self.date.year, self._get_latest_results)
+            if data is None:
                 return
+            return {"results": data["results"][:amount], "url": data["url"]}
+        except Exception:
+            logger.exception(f"Error getting race results for year {self.date.year}")
 
-            results_url = self.base_url + race_links[-1]
-            selector = set_selector(results_url, "utf8")
+    async def _get_latest_results(self):
+        season = await FormulaRace().get_season()
+        race = season.last_race(self.date - self.RACE_DURATION) if season else None
+        if season is not None and race is None:
+            logger.info(f"No past races found for year {self.date.year}")
+            return
+
+        rounds = await self._load_results()
+        if race is not None and str(race["round"]) not in rounds:
+            # Another container may have ingested the round already
+            rounds = await self._load_results(reload=True)
+        if race is not None and str(race["round"]) in rounds:
+            return self._latest_results(rounds)
+
+        if race is not None and (self.date.year, race["round"]) in _unpublished_rounds:
+            return self._latest_results(rounds)
+        data = await self._fetch_results(race)
+        if data is None:
+            # Latest round may not be published yet
+            if race is not None:
+                _unpublished_rounds.set((self.date.year, race["round"]), True)
+            return self._latest_results(rounds)
+        if race is not None:
+            rounds[str(race["round"])] = data
+            await cache_backend.set(f"f1_results:{self.date.year}", rounds)
+        return data
+
+    async def _fetch_results(self, race=None):
+        """
+        Gets results of given race weekend or the latest race on the races index
+        """
+        url = f"{self.base_url}/en/results/{self.date.year}/races"
+        container = await find_element(url, "div", id="results-table")
+        races_table = container.xpath(".//table") if container is not None else None
+
+        if not races_table:
+            logger.info(f"Races table not found for year {self.date.year}")
+            return
+
+        race_links = races_table.xpath(".//a[@href]/@href").getall()
+        race_link = race_links[-1] if race is None and race_links else None
+        if race is not None:
+            race_link = self._find_race_link(race_links, race)
+        if race_link is None:
+            round_number = race["round"] if race is not None else None
+            logger.info(f"No results found for round {round_number} of year {self.date.year}")
+            return
+
+        results_url = self.base_url + race_link
+        container = await find_element(results_url, "div", id="results-table")
+        table = container.xpath(".//table") if container is not None else None
+
+        if not table:
+            logger.info(f"Results table not found for year {self.date.year}")
+            return
+
+        results = [
+            {"name": name, "position": position, "time": time}
+            for position, name, time in RESULTS_TABLE.extract(table[0])
+        ]
+        if not results:
+            return
+        return {"results": results, "url": results_url}
 
-            table = selector.xpath("//div[@id='results-table']//table")
+    def _find_race_link(self, race_links, race):
+        """
+        Gets results link of race weekend by the race slug of its calendar url,
+        rows of the index don't follow calendar rounds when races are cancelled
+        """
+        slug = self._normalize_slug(race["raceUrl"].rstrip("/").split("/")[-1])
+        if not slug:
+            return None
+        return next(
+            (
+                link
+                for link in race_links
+                if slug in (self._normalize_slug(part) for part in link.split("/"))
+            ),
+            None,
+        )
 
-            if not table:
-                logger.info(f"Results table not found for year {self.date.year}")
-                return
+    def _normalize_slug(self, slug):
+        return slug.lower().replace("-", "").replace("_", "")
 
-            rows = table.xpath(".//tr[position() > 1 and position() < last()]")
-            results = []
-            for row in rows:
-                cells = [td.xpath("string()").get().strip() for td in row.xpath(".//td")]
-
-                if len(cells) < 4:
-                    continue
-
-                results.append(
-                    {
-                        "name": cells[2],
-                        "position": cells[0],
-                        "time": cells[-2],
-                    }
-                )
-            return {
-                "results": results[:amount],
-                "url": results_url,
-            }
+    async def _load_results(self, reload=False):
+        year = self.date.year
+        if year not in _results or reload:
+            stored = await cache_backend.get(f"f1_results:{year}") or {}
+            _results[year] = _results.get(year, {}) | stored
+        return _results[year]
 
-        except Exception:
-            logger.exception(f"Error getting race results for year {self.date.year}")
+    def _latest_results(self, rounds):
+        if not rounds:
+            return None
+        return rounds[max(rounds, key=int)]
 
     def format(self, data):
         url = data["url"]
@@ -0,0 +1,71 @@
+from bisect import bisect_left, bisect_right
+
+
+class RaceSeason:
+    """
+    Race weekends of a season indexed by start times. Sessions and races
+    are kept in sorted arrays, so upcoming lookups are binary searches and
+    the same model can be queried many times once built.
+    """
+
+    def __init__(self, race_weekends):
+        self.race_weekends = race_weekends
+        races = sorted(
+            (rw["sessions"]["race"], index)
+            for index, rw in enumerate(race_weekends)
+            if "race" in rw["sessions"]
+        )
+        self.race_times = [date for date, _ in races]
+        self.race_indexes = [index for _, index in races]
+        sessions = sorted(
+            (date, index, session)
+            for index, rw in enumerate(race_weekends)
+            for session, date in rw["sessions"].items()
+        )
+        self.session_times = [date for date, _, _ in sessions]
+        self.sessions = [(index, session) for _, index, session in sessions]
+        # Positions of every session type in the sorted sessions
+        self.session_positions = {}
+        for position, (_, _, session) in enumerate(sessions):
+            self.session_positions.setdefault(session, []).append(position)
+
+    def __len__(self):
+        return len(self.race_weekends)
+
+    def next_race(self, date):
+        """
+        Gets race weekend of the first race starting at or after date,
+        or the last race weekend when the season is over
+        """
+        if not self.race_weekends:
+            return None
+        position = bisect_left(self.race_times, date)
+        if position == len(self.race_times):
+            return self.race_weekends[-1]
+        return self.race_weekends[self.race_indexes[position]]
+
+    def last_race(self, date):
+        """
+        Gets race weekend of the latest race started at or before date
+        """
+        position = bisect_right(self.race_times, date)
+        if position == 0:
+            return None
+        return self.race_weekends[self.race_indexes[position - 1]]
+
+    def next_session(self, date, session=None):
+        """
+        Gets (race weekend, session, start time) of the first session starting
+        at or after date, optionally only sessions of given type
+        """
+        position = bisect_left(self.session_times, date)
+        if session is not None:
+            positions = self.session_positions.get(session, [])
+            index = bisect_left(positions, position)
+            if index == len(positions):
+                return None
+            position = positions[index]
+        if position == len(self.session_times):
+            return None
+        index, name = self.sessions[position]
+        return self.race_weekends[index], name, self.session_times[position]
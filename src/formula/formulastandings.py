@@ -1,49 +1,56 @@
 import re
 from .formulabase import FormulaBase
 from ..common.logger import logging
+from ..common.tables import Column, TableExtractor
 from ..common.utils import (
     format_as_monospace,
     format_as_header,
     format_as_url,
     format_number,
-    set_selector,
+    find_element,
 )
 
 logger = logging.getLogger(__name__)
 
+DRIVER_STANDINGS_TABLE = TableExtractor(
+    [
+        Column("position", "Pos", 0),
+        Column("driver", "Driver", 1),
+        Column("points", "Pts", -1, float),
+    ],
+    min_cells=3,
+)
+TEAM_STANDINGS_TABLE = TableExtractor(
+    [
+        Column("position", "Pos", 0),
+        Column("team", "Team", 1),
+        Column("points", "Pts", -1, float),
+    ],
+    min_cells=3,
+)
+
 
 class FormulaStandings(FormulaBase):
     def __init__(self):
         super().__init__()
 
-    def get_driver_standings(self, amount=5):
+    async def get_driver_standings(self, amount=5):
         """
         Gets top drivers from overall standings and url for more details
         """
         url = f"{self.base_url}/en/results/{self.date.year}/drivers"
         try:
-            selector = set_selector(url, "utf8")
-            table = selector.xpath("//div[@id='results-table']//table")
+            container = await find_element(url, "div", id="results-table")
+            table = container.xpath(".//table") if container is not None else None
 
             if not table:
                 logger.info(f"Driver standings table not found for year {self.date.year}")
                 return
 
-            rows = table.xpath(".//tr[position() > 1]")  # exclude header
-            standings = []
-            for row in rows:
-                cells = [td.xpath("string()").get().strip() for td in row.xpath(".//td")]
-
-                if len(cells) < 3:
-                    continue
-
-                standings.append(
-                    {
-                        "driver": cells[1],
-                        "position": cells[0],
-                        "points": float(cells[-1]),
-                    }
-                )
+            standings = [
+                {"driver": driver, "position": position, "points": points}
+                for position, driver, points in DRIVER_STANDINGS_TABLE.extract(table[0])
+            ]
             amount = max(len(standings), amount)
             return {
                 "driverStandings": standings[:amount],
@@ -52,35 +59,23 @@ class FormulaStandings(FormulaBase):
         except Exception:
             logger.exception(f"Error getting driver standings for year {self.date.year}")
 
-    def get_team_standings(self, amount=5):
+    async def get_team_standings(self, amount=5):
         """
         Gets top teams from overall standings and url for more details
         """
         url = f"{self.base_url}/en/results/{self.date.year}/team"
         try:
-            selector = set_selector(url, "utf8")
-            table = selector.xpath("//div[@id='results-table']//table")
+            container = await find_element(url, "div", id="results-table")
+            table = container.xpath(".//table") if container is not None else None
 
             if not table:
                 logger.info(f"Team standings table not found for year {self.date.year}")
                 return
 
-            rows = table.xpath(".//tr[position() > 1]")  # exclude header
-            standings = []
-            for row in rows:
-                cells = row.xpath(".//td/text()").getall()
-                cells = [td.xpath("string()").get().strip() for td in row.xpath(".//td")]
-
-                if len(cells) < 3:
-                    continue
-
-                standings.append(
-                    {
-                        "team": cells[1],
-                        "position": cells[0],
-                        "points": float(cells[-1]),
-                    }
-                )
+            standings = [
+                {"team": team, "position": position, "points": points}
+                for position, team, points in TEAM_STANDINGS_TABLE.extract(table[0])
+            ]
             amount = max(len(standings), amount)
             return {
                 "teamStandings": standings[:amount],
@@ -1,20 +1,41 @@
 import asyncio
 import json
+import os
 from http import HTTPStatus
-from .bot import Bot
+from .bot import get_bot
 from .command import Command, ResponseType
+from .common import background
+from .common.backends import cache_backend
 from .common.logger import logging
 
 logger = logging.getLogger(__name__)
 
+# Answer with a Bot API method in webhook response instead of a separate API call
+WEBHOOK_REPLY = os.getenv("WEBHOOK_REPLY", "false").lower() == "true"
+MAX_TEXT_LENGTH = 4096
+MAX_CAPTION_LENGTH = 1024
+# Seconds left for returning after background refreshes
+BACKGROUND_MARGIN = 1
+BACKGROUND_TIMEOUT = 5
+# Seconds kept for sending the reply after it has been computed
+REPLY_MARGIN = 2
+
+# Kept across warm invocations so pooled connections bound to it stay usable
+_loop = asyncio.new_event_loop()
+
 
 def webhook(event, context):
-    result = asyncio.run(webhook_async(event, context))
+    result = _loop.run_until_complete(webhook_async(event, context))
+    return result
+
+
+def refresh(event, context):
+    result = _loop.run_until_complete(refresh_async(event, context))
     return result
 
 
 def set_webhook(event, context):
-    result = asyncio.run(set_webhook_async(event, context))
+    result = _loop.run_until_complete(set_webhook_async(event, context))
     return result
 
 
@@ -23,17 +44,25 @@ async def webhook_async(event, context):
         try:
             logger.info("Message received")
             data = json.loads(event["body"])
-            bot = Bot()
-            text = bot.get_message_text(data)
+            message = get_message(data)
+            text = message.get("text") if message is not None else None
             if text and text.startswith("/"):
-                cmd = Command(text)
-                res = cmd.response
+                cmd = Command(text, timeout=get_time_left(context, REPLY_MARGIN))
+                res = await cmd.get_response()
                 if res is not None:
                     logger.info(f"Command received: {text}")
+                    chat_id = message["chat"]["id"]
+                    reply = create_webhook_reply(chat_id, res) if WEBHOOK_REPLY else None
+                    if reply is not None:
+                        logger.info("Replying in webhook response")
+                        return create_response(HTTPStatus.OK, reply)
+                    bot = await get_bot()
                     if res.type == ResponseType.TEXT:
-                        await bot.send_text(res.text)
+                        await bot.send_text(chat_id, res.text)
                     else:
-                        await bot.send_image(res.image, res.text)
+                        await bot.send_image(chat_id, res.image, res.text)
+                    # Reply has been sent, so refreshing stale data doesn't delay it
+                    await drain_background_tasks(context)
             logger.info("Event handled")
             return create_response(HTTPStatus.OK, "Event handled")
         except Exception:
@@ -43,10 +72,34 @@ async def webhook_async(event, context):
     return create_response(HTTPStatus.OK, "No event to handle")
 
 
+async def refresh_async(event, context):
+    """
+    Precomputes replies of hot commands so webhook serves them from store
+    """
+    if not cache_backend.shared:
+        # Refresh runs in its own containers, webhook could never read what it stores
+        logger.warning(f"Refresh skipped, {cache_backend.name} cache backend is not shared")
+        return create_response(HTTPStatus.OK, "Refresh skipped")
+    timeout = get_time_left(context, BACKGROUND_MARGIN)
+    cmds = [Command(text, timeout=timeout) for text in Command.PRECOMPUTED_CMDS]
+    refreshes = asyncio.gather(*(cmd.refresh() for cmd in cmds), return_exceptions=True)
+    results, _ = await asyncio.gather(refreshes, Command.refresh_lookups(timeout))
+    refreshed = []
+    for cmd, result in zip(cmds, results):
+        if isinstance(result, Exception):
+            logger.error(f"Error refreshing {cmd.text}", exc_info=result)
+        elif result is not None:
+            refreshed.append(cmd.text)
+    logger.info(f"Refreshed responses: {refreshed}")
+    if len(refreshed) < len(cmds):
+        return create_response(HTTPStatus.INTERNAL_SERVER_ERROR, "Error refreshing responses")
+    return create_response(HTTPStatus.OK, "Responses refreshed")
+
+
 async def set_webhook_async(event, context):
     try:
         url = f"""https://{event["headers"]["host"]}"""
-        bot = Bot()
+        bot = await get_bot()
         webhook = await bot.set_webhook(url)
         if webhook:
             logger.info("Webhook set")
@@ -56,6 +109,62 @@ async def set_webhook_async(event, context):
         return create_response(HTTPStatus.INTERNAL_SERVER_ERROR, "Error setting webhook")
 
 
+async def drain_background_tasks(context):
+    """
+    Waits for background refreshes at most BACKGROUND_TIMEOUT seconds and
+    never past remaining execution time, as waiting is billed
+    """
+    timeout = get_time_left(context, BACKGROUND_MARGIN)
+    if timeout is None or timeout > BACKGROUND_TIMEOUT:
+        timeout = BACKGROUND_TIMEOUT
+    await background.drain(timeout)
+
+
+def get_time_left(context, margin):
+    """
+    Gets seconds left of invocation minus margin or None without Lambda context
+    """
+    if context is None:
+        return None
+    return max(0, context.get_remaining_time_in_millis() / 1000 - margin)
+
+
+def get_message(data):
+    """
+    Gets message from raw update without building Telegram objects, so
+    updates that are not commands never load the Telegram library
+    """
+    message = data.get("message") if isinstance(data, dict) else None
+    return message if isinstance(message, dict) else None
+
+
+def create_webhook_reply(chat_id, res):
+    """
+    Creates Bot API method call to return as webhook response or None if
+    the reply has to be sent with a separate API call
+    """
+    if res.type == ResponseType.TEXT:
+        if res.text is None or len(res.text) > MAX_TEXT_LENGTH:
+            return None
+        return {
+            "method": "sendMessage",
+            "chat_id": chat_id,
+            "text": res.text,
+            "parse_mode": "MarkdownV2",
+            "link_preview_options": {"is_disabled": True},
+        }
+    # Uploaded files can't be part of JSON payload, only photos by url
+    if not isinstance(res.image, str) or len(res.text or "") > MAX_CAPTION_LENGTH:
+        return None
+    return {
+        "method": "sendPhoto",
+        "chat_id": chat_id,
+        "photo": res.image,
+        "caption": res.text or "",
+        "parse_mode": "MarkdownV2",
+    }
+
+
 def create_response(status_code, message):
     return {
         "statusCode": status_code,
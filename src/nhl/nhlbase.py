@@ -1,21 +1,82 @@
+import asyncio
 import json
-import os
+from collections import Counter
 from datetime import datetime
 from pathlib import Path
-from ..common.utils import convert_timezone
+from types import MappingProxyType
+from ..common.utils import convert_timezone, get
 from ..common.logger import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _load_teams():
+    """
+    Loads static team data into read-only lookups shared by all instances
+    """
+    path = Path(__file__).resolve().parent.parent / "static" / "nhl_teams.json"
+    with open(path, "r") as f:
+        teams = json.load(f)
+    full_names = {team["shortName"]: team["fullName"] for team in teams}
+    short_names = {full_name: short_name for short_name, full_name in full_names.items()}
+
+    # Case-insensitive aliases: short name, full name and unambiguous nickname
+    nicknames = Counter(full_name.split(" ")[-1].casefold() for full_name in short_names)
+    aliases = {}
+    for short_name, full_name in full_names.items():
+        aliases[short_name.casefold()] = short_name
+        aliases[full_name.casefold()] = short_name
+        nickname = full_name.split(" ")[-1].casefold()
+        if nicknames[nickname] == 1:
+            aliases[nickname] = short_name
+    return (
+        MappingProxyType(full_names),
+        MappingProxyType(short_names),
+        MappingProxyType(aliases),
+    )
+
+
+TEAMS, TEAM_SHORT_NAMES, TEAM_ALIASES = _load_teams()
+
+
 class NHLBase:
-    def __init__(self, date=datetime.now()):
+    def __init__(self, date=None):
+        date = date if date is not None else datetime.now()
         self.date_format = "%Y-%m-%d"
         self.target_timezone = "Europe/Helsinki"
         self.date = convert_timezone(dt=date, target_tz=self.target_timezone)
         year = self.date.year
         self.season = f"{year - 1}{year}" if self.date.month < 10 else f"{year}{year + 1}"
-        path = Path(__file__).resolve().parent.parent / "static"
-        with open(os.path.join(path, "nhl_teams.json"), "r") as f:
-            teams = json.load(f)
-            self.teams = {team["shortName"]: team["fullName"] for team in teams}
+        self.teams = TEAMS
+        self.api_base_url = "https://api.nhle.com/stats/rest/en"
+        self.page_size = 100
+
+    def find_team(self, name):
+        """
+        Gets team short name by short name, full name or nickname
+        """
+        if name is None:
+            return None
+        return TEAM_ALIASES.get(" ".join(str(name).split()).casefold())
+
+    async def _fetch_rows(self, url, params, max_rows=None):
+        """
+        Yields rows of a paginated stats API query. First page tells the total
+        row count and remaining pages are requested concurrently, so their
+        rows arrive in completion order.
+        """
+        res = (await get(url, params | {"start": 0, "limit": self.page_size})).json()
+        for row in res["data"]:
+            yield row
+        total = res["total"] if max_rows is None else min(res["total"], max_rows)
+        pages = [
+            asyncio.ensure_future(get(url, params | {"start": start, "limit": self.page_size}))
+            for start in range(len(res["data"]), total, self.page_size)
+        ]
+        try:
+            for page in asyncio.as_completed(pages):
+                for row in (await page).json()["data"]:
+                    yield row
+        finally:
+            for page in pages:
+                page.cancel()
@@ -1,69 +1,156 @@
+import time
+from contextlib import aclosing
+from http import HTTPStatus
 from .nhlbase import NHLBase
+from .nhlplayers import PlayerIndex, fold_name, slugify_name
+from .nhlscoring import NHLScoring
+from ..common.backends import cache_backend
+from ..common.cache import TTLCache
 from ..common.utils import (
     escape_special_chars,
     format_as_header,
     format_as_url,
-    set_selector,
+    stream_elements,
 )
 from ..common.logger import logging
+from ..common.tables import Column, TableExtractor
 
 logger = logging.getLogger(__name__)
 
+CONTRACT_TABLE = TableExtractor(
+    [
+        Column("season", "Season", 0),
+        Column("capHit", "Cap Hit", 2),
+    ],
+    skip_footer=True,
+)
+
+PLAYER_INDEX_MAX_AGE = 24 * 60 * 60
+
+# Season roster index shared across warm invocations
+_player_index = {}
+# Names that didn't resolve to any player
+_unresolved_names = TTLCache(max_entries=1024, ttl=60 * 60)
+
 
 class NHLContract(NHLBase):
     def __init__(self):
         super().__init__()
         self.contract_base_url = "https://capwages.com/players"
 
-    def get(self, name):
-        url = f"""{self.contract_base_url}/{name.replace(" ", "-").replace("'", "").lower()}"""
+    async def get(self, name):
+        slug = await self._resolve_slug(name)
+        if slug is None:
+            logger.info(f"Player not found with name {name}")
+            return
+        url = f"""{self.contract_base_url}/{slug}"""
         try:
-            selector = set_selector(url, target_encoding="utf-8")
-
-            tables = selector.xpath(
-                "//table[contains(@class, 'min-w-full') and contains(@class, 'bg-white')]"
-            )
+            tables = stream_elements(url, "table", classes=["min-w-full", "bg-white"])
+            async with aclosing(tables):
+                # Page is read only until the table with current contract is found
+                async for table in tables:
+                    contract = self._find_contract(table)
+                    if contract:
+                        return {"contract": contract, "url": url}
 
-            if not tables:
-                logger.info(f"Contract table not found for player {name}")
+            logger.info(f"Contract table not found for player {name}")
+            _unresolved_names.set(fold_name(name), True)
+        except Exception as e:
+            if getattr(getattr(e, "response", None), "status_code", None) == HTTPStatus.NOT_FOUND:
+                logger.info(f"Player page not found for player {name}")
+                _unresolved_names.set(fold_name(name), True)
                 return
+            logger.exception(f"Error getting player contract for player {name}")
+
+    def _find_contract(self, table):
+        # Header & total rows are skipped
+        data = [
+            {"season": season.replace("-", "20"), "capHit": cap_hit}
+            for season, cap_hit in CONTRACT_TABLE.extract(table)
+        ]
+
+        return next(
+            (
+                {
+                    "yearStatus": f"{i + 1}/{len(data)}",
+                    "capHit": item["capHit"],
+                }
+                for i, item in enumerate(data)
+                if item["season"] == self.season
+            ),
+            None,
+        )
 
-            for table in tables:
-                rows = table.xpath(".//tr")[1:-1]  # skip header & total rows
-
-                data = []
-                for row in rows:
-                    cols = row.xpath(".//td")
-                    if len(cols) < 3:
-                        continue
-
-                    season = cols[0].xpath("string()").get().replace("-", "20")
-                    cap_hit = cols[2].xpath("string()").get()
-
-                    data.append(
-                        {
-                            "season": season,
-                            "capHit": cap_hit,
-                        }
-                    )
-
-                contract = next(
-                    (
-                        {
-                            "yearStatus": f"{i + 1}/{len(data)}",
-                            "capHit": item["capHit"],
-                        }
-                        for i, item in enumerate(data)
-                        if item["season"] == self.season
-                    ),
-                    None,
-                )
-
-                if contract:
-                    return {"contract": contract, "url": url}
+    async def _resolve_slug(self, name):
+        """
+        Resolves player name to capwages slug before any page is fetched
+        """
+        key = fold_name(name)
+        if key in _unresolved_names:
+            return None
+        if len(key.split(" ")) > 1:
+            # Full name maps to slug directly, so roster is only needed for last names
+            return slugify_name(name)
+        index = await self._get_player_index()
+        if index is None:
+            # Without roster, user input is the best guess
+            return slugify_name(name)
+        player_name = index.resolve(name)
+        if player_name is not None:
+            return slugify_name(player_name)
+        _unresolved_names.set(key, True)
+        return None
 
+    async def refresh_player_index(self):
+        """
+        Builds season player index and shares it through cache backend
+        """
+        index = await self._fetch_player_index()
+        if index is not None:
+            await self._save_player_index(index, time.time())
+        return index
+
+    async def _get_player_index(self):
+        if _player_index.get("season") == self.season and (
+            time.time() - _player_index["updatedAt"] < PLAYER_INDEX_MAX_AGE
+        ):
+            return _player_index["index"]
+        stored = await cache_backend.get(f"nhl_players:{self.season}")
+        if stored is not None:
+            self._remember_player_index(PlayerIndex(stored["names"]), stored["updatedAt"])
+            return _player_index["index"]
+        index = await self.refresh_player_index()
+        return index if index is not None else _player_index.get("index")
+
+    async def _save_player_index(self, index, updated_at):
+        await cache_backend.set(
+            f"nhl_players:{self.season}",
+            {"updatedAt": updated_at, "names": index.names},
+            ttl=PLAYER_INDEX_MAX_AGE,
+        )
+        self._remember_player_index(index, updated_at)
+
+    def _remember_player_index(self, index, updated_at):
+        _player_index.update({"season": self.season, "updatedAt": updated_at, "index": index})
+        _unresolved_names.clear()
+
+    async def _fetch_player_index(self):
+        try:
+            skaters = await NHLScoring().get_skater_table()
+            if skaters is None:
+                return
+            index = PlayerIndex(skaters.full_names)
+            url = f"{self.api_base_url}/goalie/summary"
+            params = {
+                "isAggregate": "false",
+                "isGame": "false",
+                "cayenneExp": f"gameTypeId=2 and seasonId<={self.season} and seasonId>={self.season}",
+            }
+            async for goalie in self._fetch_rows(url, params):
+                index.add(goalie["goalieFullName"])
+            return index
         except Exception:
-            logger.exception(f"Error getting player contract for player {name}")
+            logger.exception(f"Error getting player index for season {self.season}")
 
     def format(self, player_name, data):
         contract = {
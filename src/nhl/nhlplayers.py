@@ -0,0 +1,100 @@
+import re
+import unicodedata
+from collections import Counter, defaultdict
+
+
+def fold_name(name):
+    """
+    Normalizes name for lookups: diacritics and case are folded and
+    punctuation other than separators is dropped
+    """
+    normalized = unicodedata.normalize("NFKD", str(name))
+    ascii_name = normalized.encode("ascii", "ignore").decode("utf-8").lower()
+    ascii_name = re.sub(r"['.]", "", ascii_name)
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", ascii_name).split())
+
+
+def slugify_name(name):
+    return fold_name(name).replace(" ", "-")
+
+
+class PlayerIndex:
+    """
+    Index of player names that resolves exact full names and exact or
+    misspelled last names to canonical player names without network.
+    Full names are never matched approximately, as a name missing from the
+    index would otherwise resolve to a different player.
+    """
+
+    MIN_SIMILARITY = 0.5
+
+    def __init__(self, names=()):
+        self.names = []
+        self.exact = {}
+        self.last_names = defaultdict(list)
+        self.last_name_trigrams = defaultdict(list)
+        self.last_name_trigram_counts = []
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name):
+        key = fold_name(name)
+        if not key or key in self.exact:
+            return
+        player = len(self.names)
+        self.names.append(name)
+        self.exact[key] = player
+        last_name = key.split(" ")[-1]
+        self.last_names[last_name].append(player)
+        self._add_trigrams(
+            last_name, player, self.last_name_trigrams, self.last_name_trigram_counts
+        )
+
+    def resolve(self, name):
+        """
+        Gets canonical name for given name or None if there's no single good match
+        """
+        key = fold_name(name)
+        if not key:
+            return None
+        if key in self.exact:
+            return self.names[self.exact[key]]
+        if " " in key:
+            return None
+        if len(self.last_names.get(key, [])) == 1:
+            return self.names[self.last_names[key][0]]
+
+        # Unknown single word is most likely a misspelled last name
+        scores = self._similarities(key, self.last_name_trigrams, self.last_name_trigram_counts)
+        if not scores or scores[0][0] < self.MIN_SIMILARITY:
+            return None
+        if len(scores) > 1 and scores[1][0] == scores[0][0]:
+            return None
+        return self.names[scores[0][1]]
+
+    def _add_trigrams(self, key, player, index, counts):
+        trigrams = self._trigrams(key)
+        counts.append(len(trigrams))
+        for trigram in trigrams:
+            index[trigram].append(player)
+
+    def _similarities(self, key, index, counts):
+        """
+        Gets (Jaccard similarity of trigrams, player) pairs, most similar first
+        """
+        trigrams = self._trigrams(key)
+        shared = Counter(player for trigram in trigrams for player in index.get(trigram, ()))
+        return sorted(
+            (
+                (count / (len(trigrams) + counts[player] - count), player)
+                for player, count in shared.items()
+            ),
+            reverse=True,
+        )
+
+    def _trigrams(self, key):
+        padded = f"  {key} "
+        return {"".join(chars) for chars in zip(padded, padded[1:], padded[2:])}
@@ -1,61 +1,157 @@
 import json
+import time
 from src.common.utils import format_as_monospace, format_as_header, format_as_url, get
-from .nhlbase import NHLBase
+from .nhlbase import NHLBase, TEAM_SHORT_NAMES
+from .nhlskaters import SkaterTable
+from ..common.backends import cache_backend
 from ..common.logger import logging
+from ..common.singleflight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+FRANCHISE_INDEX_MAX_AGE = 30 * 24 * 60 * 60
+# Minimum index age before a missing team triggers a refresh
+FRANCHISE_INDEX_MISS_REFRESH_AGE = 60 * 60
+# Seconds a failed index refresh is not retried
+FRANCHISE_INDEX_RETRY_AGE = 60
+
+SKATER_TABLE_MAX_AGE = 30 * 60
+# More leaders wouldn't fit in one Telegram message
+MAX_LEADERS = 100
+
+# Team short name to franchise id, shared across warm invocations
+_franchise_index = {}
+# Time of the latest failed franchise index refresh
+_franchise_index_failed_at = 0
+# Season to latest skater table snapshot
+_skater_tables = {}
+# Concurrent identical queries and table refreshes share one fetch
+_scoring_flights = SingleFlight("NHL scoring")
+
 
 class NHLScoring(NHLBase):
     def __init__(self):
         super().__init__()
-        self.api_base_url = "https://api.nhle.com/stats/rest/en"
         self.details_url = "https://www.nhl.com/stats/skaters"
 
-    def get_scoring_leaders(self, amount=10, filter=None):
+    async def get_scoring_leaders(self, amount=10, filter=None, position=None, min_games=None):
         sanitized_filter = self._sanitize_filter(filter)
+        amount = min(amount, MAX_LEADERS)
+        key = (self.season, amount, sanitized_filter, position, min_games)
+        try:
+            return await _scoring_flights.do(
+                key, self._get_scoring_leaders, amount, sanitized_filter, position, min_games
+            )
+        except Exception:
+            logger.exception(
+                f"Error getting scoring leaders for season {self.season} with filter {sanitized_filter}"
+            )
+
+    async def _get_scoring_leaders(self, amount, sanitized_filter, position, min_games):
+        table = await self.get_skater_table()
+        if table is None:
+            # Query filtered leaders directly when season table is unavailable
+            return await self._query_scoring_leaders(amount, sanitized_filter, position, min_games)
+
+        team = sanitized_filter if sanitized_filter in self.teams else None
+        nationality = sanitized_filter.upper() if sanitized_filter and team is None else None
+        leaders = table.top(
+            amount,
+            team=team,
+            nationality=nationality,
+            position=position,
+            min_games=min_games,
+        )
+        if not leaders:
+            logger.info(
+                f"No scoring info found for season {self.season} with filter {sanitized_filter}"
+            )
+            return
+        return [{"rank": idx + 1} | table.row(index) for idx, index in enumerate(leaders)]
+
+    async def get_skater_table(self):
+        """
+        Gets season skater table, refreshed when older than max age
+        """
+        cached = _skater_tables.get(self.season)
+        if cached is not None and time.time() - cached["updatedAt"] < SKATER_TABLE_MAX_AGE:
+            return cached["table"]
+        snapshot = await _scoring_flights.do(("table", self.season), self._load_skater_table)
+        if snapshot is None:
+            # Outdated table is still better than a filtered query per request
+            return cached["table"] if cached is not None else None
+        _skater_tables.clear()
+        _skater_tables[self.season] = snapshot
+        return snapshot["table"]
+
+    async def _load_skater_table(self):
+        """
+        Gets table snapshot stored by any container or fetches a new one
+        """
+        key = f"nhl_skaters:{self.season}"
+        stored = await cache_backend.get(key)
+        if stored is not None:
+            return {
+                "updatedAt": stored["updatedAt"],
+                "table": SkaterTable.from_dict(stored["table"]),
+            }
+        table = await self._fetch_skater_table()
+        if table is None:
+            return None
+        snapshot = {"updatedAt": time.time(), "table": table}
+        await cache_backend.set(
+            key,
+            {"updatedAt": snapshot["updatedAt"], "table": table.to_dict()},
+            ttl=SKATER_TABLE_MAX_AGE,
+        )
+        return snapshot
+
+    async def _fetch_skater_table(self, exp=None, min_games=None, max_rows=None):
         url = f"{self.api_base_url}/skater/summary"
+        exp = exp if exp is not None else self._season_exp()
+        table = SkaterTable()
+        try:
+            # Rows are ranked by the table, so pages can be added in completion order
+            params = self._create_params(exp, min_games=min_games)
+            async for player in self._fetch_rows(url, params, max_rows=max_rows):
+                table.append(player)
+            return table
+        except Exception:
+            logger.exception(f"Error getting skater table for season {self.season} with {exp}")
+
+    async def _query_scoring_leaders(self, amount, filter, position=None, min_games=None):
+        exp = self._season_exp()
+        try:
+            exp += await self._create_filter(filter) or ""
+        except LookupError:
+            # Unfiltered or nationality results would be a wrong answer for a team
+            logger.exception(f"Error creating filter {filter} for season {self.season}")
+            return
+        if position is not None:
+            exp += f""" and positionCode=\"{position}\""""
+        table = await self._fetch_skater_table(exp, min_games=min_games, max_rows=amount)
+        if not table:
+            logger.info(f"No scoring info found for season {self.season} with filter {filter}")
+            return
+        return [{"rank": idx + 1} | table.row(index) for idx, index in enumerate(table.top(amount))]
+
+    def _season_exp(self):
+        return f"""gameTypeId=2 and seasonId<={self.season} and seasonId>={self.season}"""
+
+    def _create_params(self, exp, min_games=None):
         sort = [
             {"property": "points", "direction": "DESC"},
             {"property": "goals", "direction": "DESC"},
             {"property": "assists", "direction": "DESC"},
             {"property": "playerId", "direction": "ASC"},
         ]
-        exp = f"""gameTypeId=2 and seasonId<={self.season} and seasonId>={self.season}"""
-        exp += self._create_filter(sanitized_filter) or ""
-        params = {
+        return {
             "isAggregate": "false",
             "isGame": "false",
             "sort": json.dumps(sort),
-            "start": 0,
-            "limit": 100,
-            "factCayenneExp": "gamesPlayed>=1",
+            "factCayenneExp": f"gamesPlayed>={max(min_games or 1, 1)}",
             "cayenneExp": exp,
         }
-        try:
-            res = get(url, params).json()
-            if not res["data"]:
-                logger.info(
-                    f"No scoring info found for season {self.season} with filter {sanitized_filter}"
-                )
-                return
-            data = [
-                {
-                    "rank": idx + 1,
-                    "name": player["lastName"],
-                    "team": player["teamAbbrevs"],
-                    "gamesPlayed": player["gamesPlayed"],
-                    "goals": player["goals"],
-                    "assists": player["assists"],
-                    "points": player["points"],
-                }
-                for idx, player in enumerate(res["data"][:amount])
-            ]
-            return data
-        except Exception:
-            logger.exception(
-                f"Error getting scoring leaders for season {self.season} with filter {sanitized_filter}"
-            )
 
     def format(self, data):
         highest_points = max(data, key=lambda x: x["points"])
@@ -88,24 +184,52 @@ class NHLScoring(NHLBase):
     def _sanitize_filter(self, filter):
         if filter is None:
             return None
+        team = self.find_team(filter)
+        if team is not None:
+            return team
         if len(str(filter)) != 3 or not str(filter).isalpha():
             return None
         return filter
 
-    def _create_filter(self, filter):
+    async def _create_filter(self, filter):
         if filter is not None:
-            franchises = self._get_franchises()
-            if filter.upper() in franchises:
-                return f"""and franchiseId=\"{franchises[filter.upper()]}\""""
-            else:
-                return f"""and nationalityCode=\"{filter.upper()}\""""
+            # Franchise lookup is only needed when filter is a known team
+            if filter.upper() in self.teams:
+                franchise_id = await self._get_franchise_id(filter.upper())
+                if franchise_id is None:
+                    raise LookupError(f"No franchise found for team {filter.upper()}")
+                return f"""and franchiseId=\"{franchise_id}\""""
+            return f"""and nationalityCode=\"{filter.upper()}\""""
 
-    def _get_franchises(self):
+    async def _get_franchise_id(self, team):
+        """
+        Gets franchise id of team from index, raises if there's no index to use
+        """
+        if not _franchise_index:
+            _franchise_index.update(await cache_backend.get("nhl_franchises") or {})
+        age = time.time() - _franchise_index.get("updatedAt", 0)
+        outdated = age > FRANCHISE_INDEX_MAX_AGE or (
+            team not in _franchise_index["franchises"] and age > FRANCHISE_INDEX_MISS_REFRESH_AGE
+        )
+        if outdated and time.time() - _franchise_index_failed_at > FRANCHISE_INDEX_RETRY_AGE:
+            await self._refresh_franchise_index()
+        if "franchises" not in _franchise_index:
+            raise LookupError("Franchise index is not available")
+        return _franchise_index["franchises"].get(team)
+
+    async def _refresh_franchise_index(self):
+        global _franchise_index_failed_at
         url = f"{self.api_base_url}/franchise"
-        res = get(url).json()
-        franchises = {}
-        for team in res["data"]:
-            for key, value in self.teams.items():
-                if value == team["fullName"]:
-                    franchises[key] = team["id"]
-        return franchises
+        try:
+            res = (await get(url)).json()
+            franchises = {
+                TEAM_SHORT_NAMES[team["fullName"]]: team["id"]
+                for team in res["data"]
+                if team["fullName"] in TEAM_SHORT_NAMES
+            }
+            _franchise_index.update({"updatedAt": time.time(), "franchises": franchises})
+            await cache_backend.set("nhl_franchises", _franchise_index)
+        except Exception:
+            # Previous index is still usable if refresh fails
+            logger.exception("Error refreshing franchise index")
+            _franchise_index_failed_at = time.time()
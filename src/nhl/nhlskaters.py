@@ -0,0 +1,110 @@
+import heapq
+import sys
+from array import array
+from itertools import compress
+
+
+class SkaterTable:
+    """
+    Season skater stats stored column-wise. Numbers are kept in typed
+    arrays and repeated strings are interned, so the whole league fits in
+    a small amount of memory and filters run over plain columns.
+    """
+
+    def __init__(self):
+        self.player_ids = array("L")
+        self.games_played = array("H")
+        self.goals = array("H")
+        self.assists = array("H")
+        self.points = array("H")
+        self.last_names = []
+        self.full_names = []
+        self.teams = []
+        self.nationalities = []
+        self.positions = []
+
+    def __len__(self):
+        return len(self.player_ids)
+
+    def to_dict(self):
+        return {
+            "playerIds": self.player_ids.tolist(),
+            "gamesPlayed": self.games_played.tolist(),
+            "goals": self.goals.tolist(),
+            "assists": self.assists.tolist(),
+            "points": self.points.tolist(),
+            "lastNames": self.last_names,
+            "fullNames": self.full_names,
+            "teams": self.teams,
+            "nationalities": self.nationalities,
+            "positions": self.positions,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        table = cls()
+        table.player_ids.extend(data["playerIds"])
+        table.games_played.extend(data["gamesPlayed"])
+        table.goals.extend(data["goals"])
+        table.assists.extend(data["assists"])
+        table.points.extend(data["points"])
+        table.last_names = list(data["lastNames"])
+        table.full_names = list(data["fullNames"])
+        table.teams = [sys.intern(value) for value in data["teams"]]
+        table.nationalities = [sys.intern(value) for value in data["nationalities"]]
+        table.positions = [sys.intern(value) for value in data["positions"]]
+        return table
+
+    def append(self, player):
+        self.player_ids.append(player["playerId"])
+        self.games_played.append(player["gamesPlayed"])
+        self.goals.append(player["goals"])
+        self.assists.append(player["assists"])
+        self.points.append(player["points"])
+        self.last_names.append(player["lastName"])
+        self.full_names.append(player["skaterFullName"])
+        self.teams.append(sys.intern(player["teamAbbrevs"] or ""))
+        self.nationalities.append(sys.intern(player["nationalityCode"] or ""))
+        self.positions.append(sys.intern(player["positionCode"] or ""))
+
+    def select(self, team=None, nationality=None, position=None, min_games=None):
+        """
+        Gets indexes of rows matching all given filters
+        """
+        masks = []
+        if team is not None:
+            # Players traded during season have comma separated teams
+            teams = {value for value in set(self.teams) if team in value.split(",")}
+            masks.append([value in teams for value in self.teams])
+        if nationality is not None:
+            masks.append([value == nationality for value in self.nationalities])
+        if position is not None:
+            masks.append([value == position for value in self.positions])
+        if min_games is not None:
+            masks.append([value >= min_games for value in self.games_played])
+        rows = range(len(self))
+        if not masks:
+            return rows
+        return compress(rows, map(all, zip(*masks)))
+
+    def top(self, amount, **filters):
+        """
+        Gets indexes of scoring leaders matching filters, ordered by
+        points, goals and assists
+        """
+        points, goals, assists, player_ids = self.points, self.goals, self.assists, self.player_ids
+        return heapq.nsmallest(
+            amount,
+            self.select(**filters),
+            key=lambda i: (-points[i], -goals[i], -assists[i], player_ids[i]),
+        )
+
+    def row(self, index):
+        return {
+            "name": self.last_names[index],
+            "team": self.teams[index],
+            "gamesPlayed": self.games_played[index],
+            "goals": self.goals[index],
+            "assists": self.assists[index],
+            "points": self.points[index],
+        }
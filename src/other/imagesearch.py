@@ -15,7 +15,7 @@ class ImageSearch:
         pass
 
     # Search image url with given keyword
-    def get_random_image(self, keyword):
+    async def get_random_image(self, keyword):
         url = "https://customsearch.googleapis.com/customsearch/v1"
         params = {
             "key": self.GOOGLE_API_KEY,
@@ -27,7 +27,7 @@ class ImageSearch:
             "q": keyword,
         }
         try:
-            data = get(url, params).json()
+            data = (await get(url, params)).json()
             if "items" in data:
                 images = [result["link"] for result in data["items"]]
                 image = random.choice(images)
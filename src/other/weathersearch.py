@@ -1,9 +1,36 @@
 import os
+import unicodedata
+from ..common.backends import cache_backend
+from ..common.cache import TTLCache
 from ..common.logger import logging
+from ..common.singleflight import SingleFlight
 from ..common.utils import get, format_as_header, format_as_monospace
 
 logger = logging.getLogger(__name__)
 
+GEOCODE_TTL = 30 * 24 * 60 * 60
+GEOCODE_MISS_TTL = 24 * 60 * 60
+
+# Coordinates by normalized location, empty for places geocoder doesn't know
+_geocodes = TTLCache(max_entries=1024, ttl=GEOCODE_TTL)
+
+# OpenWeather updates observations about every 10 minutes
+OBSERVATION_TTL = 10 * 60
+OBSERVATION_GRID = 0.05
+
+# Observation payloads by grid cell and requests for them in flight
+_observations = TTLCache(max_entries=256, ttl=OBSERVATION_TTL)
+_observation_flights = SingleFlight("Weather observation")
+
+
+def location_key(location, region=""):
+    """
+    Normalizes location for lookups: diacritics, case and whitespace are folded
+    """
+    normalized = unicodedata.normalize("NFKD", str(location))
+    folded = "".join(char for char in normalized if not unicodedata.combining(char))
+    return " ".join(folded.casefold().split() + [region.casefold()])
+
 
 class WeatherSearch:
     GOOGLE_API_KEY = os.environ["GOOGLE_API_KEY"]
@@ -14,19 +41,12 @@ class WeatherSearch:
         pass
 
     # Get specific weather data for given location
-    def get_info(self, location):
+    async def get_info(self, location):
         try:
-            coords = self._get_coords(location)
+            coords = await self._get_coords(location)
             if coords is None:
                 return
-            url = "https://api.openweathermap.org/data/2.5/weather"
-            params = {
-                "lat": coords["lat"],
-                "lon": coords["lng"],
-                "units": "metric",
-                "appid": self.OPENWEATHER_API_KEY,
-            }
-            data = get(url, params).json()
+            data = await self._get_observation(coords)
             info = {
                 "description": data["weather"][0]["description"],
                 "temperature": round(data["main"]["temp"], 1),
@@ -75,8 +95,45 @@ class WeatherSearch:
         except Exception:
             logger.exception(f"Error getting weather icon for data {data}")
 
+    # Get weather observation for grid cell of coordinates
+    async def _get_observation(self, coords):
+        cell = (
+            round(coords["lat"] / OBSERVATION_GRID),
+            round(coords["lng"] / OBSERVATION_GRID),
+        )
+        data = _observations.get(cell)
+        if data is not None:
+            return data
+        return await _observation_flights.do(cell, self._fetch_observation, cell)
+
+    async def _fetch_observation(self, cell):
+        url = "https://api.openweathermap.org/data/2.5/weather"
+        params = {
+            "lat": round(cell[0] * OBSERVATION_GRID, 4),
+            "lon": round(cell[1] * OBSERVATION_GRID, 4),
+            "units": "metric",
+            "appid": self.OPENWEATHER_API_KEY,
+        }
+        # Observation may have been fetched by another container
+        key = f"weather:{params['lat']}:{params['lon']}"
+        data = await cache_backend.get(key)
+        if data is None:
+            data = (await get(url, params)).json()
+            await cache_backend.set(key, data, ttl=OBSERVATION_TTL)
+        _observations.set(cell, data)
+        return data
+
     # Get coordinates for given location
-    def _get_coords(self, location):
+    async def _get_coords(self, location):
+        key = location_key(location, self.REGION)
+        cached = _geocodes.get(key)
+        if cached is None:
+            cached = await cache_backend.get(f"geocode:{key}")
+            if cached is not None:
+                ttl = GEOCODE_TTL if cached["coords"] is not None else GEOCODE_MISS_TTL
+                _geocodes.set(key, cached, ttl=ttl)
+        if cached is not None:
+            return cached["coords"]
         try:
             url = "https://maps.googleapis.com/maps/api/geocode/json"
             params = {
@@ -84,11 +141,20 @@ class WeatherSearch:
                 "address": location,
                 "region": self.REGION.lower(),
             }
-            data = get(url, params).json()
+            data = (await get(url, params)).json()
             if not data["results"]:
                 logger.info(f"No coordinates found with {location}")
+                # Errors such as exceeded quota also come without results
+                if data.get("status") == "ZERO_RESULTS":
+                    await self._save_geocode(key, None, GEOCODE_MISS_TTL)
                 return
             coords = data["results"][0]["geometry"]["location"]
+            coords = {"lat": coords["lat"], "lng": coords["lng"]}
+            await self._save_geocode(key, coords, GEOCODE_TTL)
             return coords
         except Exception:
             logger.exception(f"Error getting coordinates for location {location}")
+
+    async def _save_geocode(self, key, coords, ttl):
+        _geocodes.set(key, {"coords": coords}, ttl=ttl)
+        await cache_backend.set(f"geocode:{key}", {"coords": coords}, ttl=ttl)
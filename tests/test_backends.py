@@ -0,0 +1,190 @@
+import asyncio
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+from src.common import backends
+from src.common.backends import (
+    CacheBackend,
+    FileBackend,
+    MemoryBackend,
+    RedisBackend,
+    SQLiteBackend,
+    create_backend,
+    decode,
+    encode,
+)
+
+
+class RedisStandIn:
+    """
+    Local server answering the Redis commands used by RedisBackend
+    """
+
+    def __init__(self, password=None):
+        self.password = password
+        self.data = {}
+        self.commands = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        authenticated = self.password is None
+        try:
+            while line := await reader.readline():
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                name = args[0].decode().upper()
+                self.commands.append(name)
+                if name == "AUTH":
+                    authenticated = args[1].decode() == self.password
+                    writer.write(b"+OK\r\n" if authenticated else b"-ERR invalid password\r\n")
+                elif not authenticated:
+                    writer.write(b"-NOAUTH Authentication required\r\n")
+                elif name == "SELECT":
+                    writer.write(b"+OK\r\n")
+                elif name == "SET":
+                    self.data[args[1]] = args[2]
+                    writer.write(b"+OK\r\n")
+                elif name == "GET":
+                    value = self.data.get(args[1])
+                    if value is None:
+                        writer.write(b"$-1\r\n")
+                    else:
+                        writer.write(b"$%d\r\n%s\r\n" % (len(value), value))
+                elif name == "DEL":
+                    writer.write(b":%d\r\n" % int(self.data.pop(args[1], None) is not None))
+                else:
+                    writer.write(b"-ERR unknown command\r\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+class TestEncoding(unittest.TestCase):
+    def test_round_trip(self):
+        value = {"name": "Grand Prix", "sessions": [1, 2.5, None, True], "text": "ä" * 100}
+        data = encode(value)
+        self.assertEqual(data[0], backends.FORMAT_VERSION)
+        self.assertLess(len(data), 100)
+        self.assertEqual(decode(data), value)
+
+    def test_unknown_format_version(self):
+        self.assertIsNone(decode(bytes([backends.FORMAT_VERSION + 1]) + encode(1)[1:]))
+        self.assertIsNone(decode(None))
+
+
+class BackendTests:
+    async def test_set_and_get(self):
+        await self.backend.set("key", {"value": [1, 2]})
+        self.assertEqual(await self.backend.get("key"), {"value": [1, 2]})
+        self.assertIsNone(await self.backend.get("missing"))
+        await self.backend.delete("key")
+        self.assertIsNone(await self.backend.get("key"))
+
+    async def test_keys_are_versioned(self):
+        await self.backend.set("key", "value")
+        with patch.object(backends, "KEY_PREFIX", "telegram-bot:v0:"):
+            self.assertIsNone(await self.backend.get("key"))
+
+
+class TestMemoryBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.backend = MemoryBackend()
+
+
+class TestFileBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.backend = FileBackend(self.tmp_dir.name)
+
+    async def test_expired(self):
+        await self.backend.set("key", "value", ttl=60)
+        # Values are shared with other instances using the same directory
+        self.assertEqual(await FileBackend(self.tmp_dir.name).get("key"), "value")
+        with patch("src.common.backends.time.time", return_value=10**10):
+            self.assertIsNone(await self.backend.get("key"))
+
+    async def test_expired_files_removed(self):
+        await self.backend.set("old", "value", ttl=1)
+        await self.backend.set("kept", "value")
+        with patch("src.common.backends.time.time", return_value=10**10):
+            await self.backend.set("new", "value", ttl=60)
+        files = list(self.backend.directory.iterdir())
+        self.assertEqual(len(files), 2)
+        self.assertNotIn(self.backend._path(backends.KEY_PREFIX + "old"), files)
+
+
+class TestSQLiteBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.backend = SQLiteBackend(self.tmp_dir.name)
+
+    async def test_expired(self):
+        await self.backend.set("key", "value", ttl=60)
+        self.assertEqual(await SQLiteBackend(self.tmp_dir.name).get("key"), "value")
+        with patch("src.common.backends.time.time", return_value=10**10):
+            self.assertIsNone(await self.backend.get("key"))
+
+
+class TestRedisBackend(BackendTests, unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = RedisStandIn(password="secret")
+        await self.server.start()
+        self.backend = RedisBackend(f"redis://:secret@127.0.0.1:{self.server.port}/2")
+
+    async def asyncTearDown(self):
+        self.backend._close()
+        await self.server.stop()
+
+    async def test_connection_is_reused(self):
+        await self.backend.set("key", "value", ttl=60)
+        await self.backend.get("key")
+        self.assertEqual(self.server.commands, ["AUTH", "SELECT", "SET", "GET"])
+
+    async def test_unavailable_server_is_a_miss(self):
+        await self.server.stop()
+        self.backend._close()
+        self.assertIsNone(await self.backend.get("key"))
+        await self.backend.set("key", "value")
+
+
+class TestCreateBackend(unittest.TestCase):
+    def test_create_backend(self):
+        self.assertIsInstance(create_backend("memory"), MemoryBackend)
+        self.assertIsInstance(create_backend("sqlite"), SQLiteBackend)
+        self.assertIsInstance(create_backend("redis://localhost:6379/0"), RedisBackend)
+        with self.assertRaises(ValueError):
+            create_backend("memcached")
+        with self.assertRaises(TypeError):
+            CacheBackend()
+
+    def test_default_backend_is_temporary_file(self):
+        with patch.dict("os.environ", {"CACHE_BACKEND": "", "CACHE_DIR": ""}):
+            backend = create_backend()
+        self.assertIsInstance(backend, FileBackend)
+        self.assertEqual(backend.directory, Path(tempfile.gettempdir()) / "telegram-bot")
+        self.assertFalse(backend.shared)
+
+    def test_shared_backends(self):
+        with patch.dict("os.environ", {"CACHE_DIR": ""}):
+            self.assertFalse(create_backend("memory").shared)
+            self.assertFalse(create_backend("file").shared)
+            self.assertTrue(FileBackend("/mnt/cache").shared)
+            self.assertTrue(create_backend("redis://localhost:6379/0").shared)
+        with patch.dict("os.environ", {"CACHE_DIR": "/mnt/cache"}):
+            self.assertTrue(create_backend("sqlite").shared)
+
+
+if __name__ == "__main__":
+    unittest.main()
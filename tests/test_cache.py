@@ -0,0 +1,114 @@
+import unittest
+from src.common.cache import HTTPCache, TTLCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestTTLCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def test_expires_after_ttl(self):
+        cache = TTLCache(ttl=10, clock=self.clock)
+        cache.set("key", "value")
+        self.clock.now = 9
+        self.assertEqual(cache.get("key"), "value")
+        self.clock.now = 10
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_per_entry_ttl(self):
+        cache = TTLCache(ttl=10, clock=self.clock)
+        cache.set("short", 1, ttl=1)
+        cache.set("long", 2, ttl=100)
+        self.clock.now = 50
+        self.assertNotIn("short", cache)
+        self.assertIn("long", cache)
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(max_entries=2, clock=self.clock)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_memory_cap(self):
+        cache = TTLCache(max_bytes=10, sizeof=len, clock=self.clock)
+        cache.set("a", "12345")
+        cache.set("b", "12345")
+        cache.set("c", "123")
+        self.assertNotIn("a", cache)
+        self.assertEqual(cache.bytes, 8)
+        cache.set("d", "12345678901")
+        self.assertNotIn("d", cache)
+
+
+class TestHTTPCache(unittest.TestCase):
+    URL = "https://example.test/page"
+
+    def test_fresh_with_max_age(self):
+        cache = HTTPCache()
+        entry = cache.store(self.URL, {}, {"Cache-Control": "max-age=60"}, b"body")
+        self.assertTrue(cache.is_fresh(entry))
+        self.assertIs(cache.lookup(self.URL, {}), entry)
+
+    def test_stale_entry_has_validators(self):
+        cache = HTTPCache()
+        headers = {"Cache-Control": "no-cache", "ETag": '"v1"', "Content-Encoding": "gzip"}
+        entry = cache.store(self.URL, {}, headers, b"body")
+        self.assertFalse(cache.is_fresh(entry))
+        self.assertEqual(cache.validators(entry), {"If-None-Match": '"v1"'})
+        self.assertNotIn("content-encoding", entry["headers"])
+
+    def test_not_stored(self):
+        cache = HTTPCache()
+        self.assertIsNone(cache.store(self.URL, {}, {"Cache-Control": "no-store"}, b"body"))
+        self.assertIsNone(cache.store(self.URL, {}, {"Vary": "*"}, b"body"))
+        self.assertIsNone(cache.store(self.URL, {}, {}, b"body"))
+        self.assertIsNone(cache.lookup(self.URL, {}))
+
+    def test_revalidated_entry_is_fresh(self):
+        cache = HTTPCache()
+        entry = cache.store(self.URL, {}, {"Cache-Control": "max-age=0", "ETag": '"v1"'}, b"body")
+        self.assertFalse(cache.is_fresh(entry))
+        entry = cache.revalidated(self.URL, entry, {"Cache-Control": "max-age=60"})
+        self.assertTrue(cache.is_fresh(entry))
+        self.assertEqual(entry["content"], b"body")
+
+    def test_conditional_request_bypasses_cache(self):
+        cache = HTTPCache()
+        cache.store(self.URL, {}, {"Cache-Control": "max-age=60"}, b"body")
+        self.assertIsNone(cache.lookup(self.URL, {"if-none-match": '"v1"'}))
+
+    def test_heuristic_freshness(self):
+        cache = HTTPCache()
+        headers = {
+            "Date": "Sun, 01 Mar 2026 12:00:00 GMT",
+            "Last-Modified": "Sun, 01 Mar 2026 11:00:00 GMT",
+        }
+        entry = cache.store(self.URL, {}, headers, b"body")
+        self.assertEqual(entry["lifetime"], 360)
+
+    def test_malformed_headers(self):
+        cache = HTTPCache()
+        headers = {"Cache-Control": "max-age=soon", "Age": "old", "Expires": "never", "ETag": "1"}
+        entry = cache.store(self.URL, {}, headers, b"body")
+        self.assertEqual(entry["age"], 0)
+        self.assertEqual(entry["lifetime"], 0)
+        headers = {"Expires": "never", "Date": "today", "ETag": "1"}
+        entry = cache.store(self.URL, {}, headers, b"body")
+        self.assertEqual(entry["lifetime"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
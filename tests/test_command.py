@@ -1,11 +1,19 @@
+import asyncio
 import unittest
+from datetime import datetime, timedelta
 from io import BytesIO
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
 from ddt import ddt, data
-from src.command import Command
+from src import command
+from src.command import Command, Response
+from src.common import background, deadline
+from src.common.backends import MemoryBackend
+from src.common.cache import TTLCache
 
 
 @ddt
-class TestCommand(unittest.TestCase):
+class TestCommand(unittest.IsolatedAsyncioTestCase):
     @data(
         "/bot",
         "/weather Tampere",
@@ -18,9 +26,9 @@ class TestCommand(unittest.TestCase):
         "/nhlcontract connor mcdavid",
         "/nhlcontract andrei vasilevskiy",
     )
-    def test_valid_command(self, text, print_response=True):
+    async def test_valid_command(self, text, print_response=True):
         cmd = Command(text)
-        res = cmd.response
+        res = await cmd.get_response()
 
         if print_response:
             self._print_response(res, text)
@@ -36,9 +44,9 @@ class TestCommand(unittest.TestCase):
                 self.assertIsInstance(res.image, BytesIO)
 
     @data("/notacommand", "notacommand", "", None)
-    def test_invalid_command(self, text):
+    async def test_invalid_command(self, text):
         cmd = Command(text)
-        self.assertIsNone(cmd.response)
+        self.assertIsNone(await cmd.get_response())
 
     def _print_response(self, res, command_text):
         print(f"COMMAND: {command_text}\n")
@@ -49,5 +57,121 @@ class TestCommand(unittest.TestCase):
         print("\n\n")
 
 
+class TestStaleResponses(unittest.IsolatedAsyncioTestCase):
+    TTL = Command.CACHE_TTL[Command.F1_STANDINGS_CMD]
+
+    def setUp(self):
+        self.clock = SimpleNamespace(monotonic=lambda: self.now, time=lambda: self.now)
+        self.now = 0
+        patchers = [
+            patch.object(command, "response_cache", TTLCache()),
+            patch.object(command, "cache_backend", MemoryBackend()),
+            patch.object(command, "time", self.clock),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def get_response(self, command_response):
+        with patch.object(Command, "_command_response", command_response):
+            return await Command("/f1standings").get_response()
+
+    async def test_stale_while_revalidate(self):
+        old = await self.get_response(AsyncMock(return_value=Response(text="old")))
+
+        self.now = self.TTL - 1
+        self.assertIs(await self.get_response(AsyncMock()), old)
+
+        new = Response(text="new")
+        self.now = self.TTL + 1
+        command_response = AsyncMock(return_value=new)
+        with patch.object(Command, "_command_response", command_response):
+            self.assertIs(await Command("/f1standings").get_response(), old)
+            self.assertIs(await Command("/f1standings").get_response(), old)
+            self.assertEqual(await background.drain(1), 0)
+        # Only one refresh runs in background for concurrent stale hits
+        command_response.assert_awaited_once()
+        self.assertIs(await self.get_response(AsyncMock()), new)
+
+    async def test_stale_if_error(self):
+        old = await self.get_response(AsyncMock(return_value=Response(text="old")))
+
+        self.now = 2 * self.TTL + 1
+        self.assertIs(await self.get_response(AsyncMock(side_effect=Exception("outage"))), old)
+        missing = Response(text="No standings available", cacheable=False)
+        self.assertIs(await self.get_response(AsyncMock(return_value=missing)), old)
+
+        new = Response(text="new")
+        self.assertIs(await self.get_response(AsyncMock(return_value=new)), new)
+
+    async def test_previous_day_response_served_instead_of_error(self):
+        old = await self.get_response(AsyncMock(return_value=Response(text="old")))
+
+        tomorrow = datetime.now() + timedelta(days=1)
+        with patch.object(command, "datetime", SimpleNamespace(now=lambda: tomorrow)):
+            self.assertIs(await self.get_response(AsyncMock(side_effect=Exception("outage"))), old)
+            new = Response(text="new")
+            self.assertIs(await self.get_response(AsyncMock(return_value=new)), new)
+
+    async def test_partial_response_served_over_stale(self):
+        await self.get_response(AsyncMock(return_value=Response(text="old")))
+
+        self.now = 2 * self.TTL + 1
+        partial = Response(text="new", partial=True)
+        self.assertIs(await self.get_response(AsyncMock(return_value=partial)), partial)
+        # Partial reply isn't stored, so a later failure still falls back to stale reply
+        missing = Response(text="No standings available", cacheable=False)
+        self.assertEqual((await self.get_response(AsyncMock(return_value=missing))).text, "old")
+
+    async def test_error_without_stale_response(self):
+        with self.assertRaises(Exception):
+            await self.get_response(AsyncMock(side_effect=Exception("outage")))
+
+
+class TestDeadline(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(command, "response_cache", TTLCache()),
+            patch.object(command, "cache_backend", MemoryBackend()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_track_image_skipped_without_budget(self):
+        race = {"raceUrl": "https://f1/race"}
+        with (
+            patch(
+                "src.formula.formularace.FormulaRace.get_upcoming",
+                AsyncMock(return_value=race),
+            ),
+            patch("src.formula.formularace.FormulaRace.format", return_value="race"),
+            patch("src.formula.formularace.FormulaRace.find_track_image") as find_track_image,
+        ):
+            res = await Command("/f1race", timeout=1).get_response()
+        find_track_image.assert_not_called()
+        self.assertEqual((res.text, res.image), ("race", None))
+        # Partial reply is not cached for later requests with more time
+        self.assertEqual(len(command.response_cache), 0)
+
+    async def test_fetches_see_command_timeout(self):
+        async def command_response(cmd):
+            return Response(text=str(deadline.remaining()))
+
+        with patch.object(Command, "_command_response", command_response):
+            res = await Command("/bot", timeout=4).get_response()
+        self.assertLessEqual(float(res.text), 4)
+
+
+class TestBackground(unittest.IsolatedAsyncioTestCase):
+    async def test_drain_is_bounded(self):
+        event = asyncio.Event()
+        task = background.run_in_background(event.wait())
+        self.assertEqual(await background.drain(0.01), 1)
+        event.set()
+        self.assertEqual(await background.drain(1), 0)
+        self.assertTrue(task.done())
+
+
 if __name__ == "__main__":
     unittest.main()
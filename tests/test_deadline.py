@@ -0,0 +1,47 @@
+import asyncio
+import unittest
+from src.common import deadline
+
+
+class TestDeadline(unittest.IsolatedAsyncioTestCase):
+    def test_without_deadline(self):
+        self.assertIsNone(deadline.remaining())
+        self.assertEqual(deadline.timeout(5), 5)
+        self.assertTrue(deadline.has_budget(100))
+
+    def test_limit(self):
+        with deadline.limit(10):
+            self.assertAlmostEqual(deadline.remaining(), 10, delta=0.5)
+            self.assertEqual(deadline.timeout(5), 5)
+            self.assertFalse(deadline.has_budget(11))
+            # Nested deadline can't extend the outer one
+            with deadline.limit(60):
+                self.assertLessEqual(deadline.remaining(), 10)
+            with deadline.limit(1):
+                self.assertLessEqual(deadline.timeout(5), 1)
+        self.assertIsNone(deadline.remaining())
+
+    async def test_tasks_inherit_deadline(self):
+        with deadline.limit(2):
+            task = asyncio.ensure_future(self._remaining())
+        self.assertLessEqual(await task, 2)
+
+    async def test_bounded(self):
+        self.assertEqual(await deadline.bounded(self._remaining()), None)
+        with deadline.limit(0.01):
+            with self.assertRaises(asyncio.TimeoutError):
+                await deadline.bounded(asyncio.sleep(1))
+
+    async def test_detached_task_has_no_deadline(self):
+        with deadline.limit(2):
+            loop = asyncio.get_running_loop()
+            task = loop.create_task(self._remaining(), context=deadline.detached())
+            self.assertIsNotNone(deadline.remaining())
+        self.assertIsNone(await task)
+
+    async def _remaining(self):
+        return deadline.remaining()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,332 @@
+import asyncio
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import AsyncMock, patch
+import httpx
+from parsel import Selector
+from src.common import background
+from src.common.backends import FileBackend
+from src.formula import formularace, formularesults
+from src.formula.formularace import FormulaRace
+from src.formula.formularesults import FormulaResults
+from src.formula.formulaseason import RaceSeason
+
+
+def create_event(summary, start, race_url):
+    return (
+        "BEGIN:VEVENT\r\n"
+        f"SUMMARY:{summary}\r\n"
+        f"DTSTART:{start}\r\n"
+        f"DESCRIPTION:Race Hub\\n{race_url}\\nTickets\r\n"
+        "LOCATION:Somewhere\r\n"
+        "END:VEVENT\r\n"
+    )
+
+
+CALENDAR = (
+    "BEGIN:VCALENDAR\r\nVERSION:2.0\r\n"
+    + create_event(
+        "FORMULA 1 FIRST GRAND PRIX 2030 - Practice 1", "20300301T100000Z", "https://f1/first"
+    )
+    + create_event("FORMULA 1 FIRST GRAND PRIX 2030 - Race", "20300303T140000Z", "https://f1/first")
+    + create_event(
+        "FORMULA 1 SECOND GRAND PRIX 2030 - Qualifying", "20300309T150000Z", "https://f1/second"
+    )
+    + create_event(
+        "FORMULA 1 SECOND GRAND PRIX 2030 - Race", "20300310T140000Z", "https://f1/second"
+    )
+    + "END:VCALENDAR\r\n"
+).encode("utf-8")
+
+
+def create_response(status_code, content=b"", headers=None):
+    return httpx.Response(
+        status_code,
+        content=content,
+        headers=headers,
+        request=httpx.Request("GET", "https://calendar.test"),
+    )
+
+
+class TestFormulaRace(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        formularace._calendar_cache.clear()
+        formularace._track_images.clear()
+        patchers = [
+            patch.object(formularace, "cache_backend", FileBackend(self.tmp_dir.name)),
+            patch.object(FormulaRace, "CALENDAR_URL", "https://calendar.test"),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        formularace._calendar_cache.clear()
+        formularace._track_images.clear()
+        self.tmp_dir.cleanup()
+
+    async def test_get_upcoming(self):
+        res = create_response(200, CALENDAR)
+        with patch.object(formularace, "get", AsyncMock(return_value=res)):
+            formula_race = FormulaRace()
+            formula_race.date = datetime(2030, 3, 5)
+            race = await formula_race.get_upcoming()
+        self.assertEqual(race["raceUrl"], "https://f1/second")
+        self.assertEqual(race["round"], 2)
+        self.assertEqual(race["sessions"]["race"], datetime(2030, 3, 10, 14))
+
+    async def test_not_modified_calendar_is_not_parsed(self):
+        res = create_response(200, CALENDAR, {"ETag": '"v1"'})
+        with patch.object(formularace, "get", AsyncMock(return_value=res)):
+            expected = await FormulaRace()._get_race_weekends()
+
+        # Parsed calendar is shared with other containers through cache backend
+        formularace._calendar_cache.clear()
+        get = AsyncMock(return_value=create_response(304))
+        with (
+            patch.object(formularace, "get", get),
+            patch("icalendar.Calendar.from_ical") as from_ical,
+        ):
+            self.assertEqual(await FormulaRace()._get_race_weekends(), expected)
+            get.assert_not_awaited()
+            with patch.object(FormulaRace, "CALENDAR_MAX_AGE", 0):
+                race_weekends = await FormulaRace()._get_race_weekends()
+
+        from_ical.assert_not_called()
+        self.assertEqual(get.call_args.kwargs["headers"], {"If-None-Match": '"v1"'})
+        self.assertEqual(race_weekends, expected)
+
+    async def test_calendar_without_validators_cached(self):
+        get = AsyncMock(return_value=create_response(200, CALENDAR))
+        with patch.object(formularace, "get", get):
+            expected = await FormulaRace()._get_race_weekends()
+            self.assertEqual(await FormulaRace()._get_race_weekends(), expected)
+            get.assert_awaited_once()
+            with patch.object(FormulaRace, "CALENDAR_MAX_AGE", 0):
+                await FormulaRace()._get_race_weekends()
+        self.assertEqual(get.call_args.kwargs["headers"], {})
+
+    async def test_season_is_built_once_per_calendar(self):
+        res = create_response(200, CALENDAR, {"ETag": '"v1"'})
+        with patch.object(formularace, "get", AsyncMock(return_value=res)):
+            season = await FormulaRace().get_season()
+        with patch.object(formularace, "get", AsyncMock(return_value=create_response(304))):
+            self.assertIs(await FormulaRace().get_season(), season)
+        self.assertEqual([rw["round"] for rw in season.race_weekends], [1, 2])
+        self.assertEqual(
+            season.race_weekends[0]["sessions"],
+            {"practice 1": datetime(2030, 3, 1, 10), "race": datetime(2030, 3, 3, 14)},
+        )
+
+    async def test_track_images_are_prefetched_for_season(self):
+        async def set_selector(url, target_encoding):
+            name = url.split("/")[-1]
+            return Selector(
+                text=f"<img alt='{name}.png' src='https://img/{name}-track.png'>"
+                "<img alt='car.png' src='https://img/car.png'>"
+            )
+
+        res = create_response(200, CALENDAR, {"ETag": '"v1"'})
+        with (
+            patch.object(formularace, "get", AsyncMock(return_value=res)),
+            patch.object(formularace, "set_selector", AsyncMock(side_effect=set_selector)) as sel,
+        ):
+            formula_race = FormulaRace()
+            formula_race.date = datetime(2030, 3, 5)
+            race = await formula_race.get_upcoming()
+            image = await formula_race.find_track_image(race["raceUrl"])
+            # Only the requested image is fetched before replying
+            self.assertEqual(sel.await_count, 1)
+            await background.drain(1)
+            first_image = await formula_race.find_track_image("https://f1/first")
+
+        self.assertEqual(image, "https://img/second-track.png?a=2030")
+        self.assertEqual(first_image, "https://img/first-track.png?a=2030")
+        self.assertEqual(sel.await_count, 2)
+
+        # Images survive a restart through the cache backend
+        formularace._track_images.clear()
+        with patch.object(formularace, "set_selector", AsyncMock()) as sel:
+            image = await formula_race.find_track_image("https://f1/second")
+        sel.assert_not_awaited()
+        self.assertEqual(image, "https://img/second-track.png?a=2030")
+
+    async def test_missing_track_image_negatively_cached(self):
+        selector = Selector(text="<img alt='car.png' src='https://img/car.png'>")
+        with (
+            patch.object(formularace, "set_selector", AsyncMock(return_value=selector)) as sel,
+            patch.object(FormulaRace, "prefetch_track_images", AsyncMock()),
+        ):
+            self.assertIsNone(await FormulaRace().find_track_image("https://f1/first"))
+            self.assertIsNone(await FormulaRace().find_track_image("https://f1/first"))
+            self.assertEqual(sel.await_count, 1)
+            with patch.object(FormulaRace, "TRACK_IMAGE_MISS_TTL", 0):
+                await FormulaRace().find_track_image("https://f1/first")
+        self.assertEqual(sel.await_count, 2)
+
+    async def test_failed_track_image_lookup_not_cached(self):
+        with (
+            patch.object(formularace, "set_selector", AsyncMock(side_effect=Exception)) as sel,
+            patch.object(FormulaRace, "prefetch_track_images", AsyncMock()),
+        ):
+            self.assertIsNone(await FormulaRace().find_track_image("https://f1/first"))
+            self.assertIsNone(await FormulaRace().find_track_image("https://f1/first"))
+        self.assertEqual(sel.await_count, 2)
+
+
+class TestRaceSeason(unittest.TestCase):
+    def setUp(self):
+        self.season = RaceSeason(
+            [
+                {
+                    "name": "First",
+                    "sessions": {
+                        "practice 1": datetime(2030, 3, 1, 10),
+                        "race": datetime(2030, 3, 3, 14),
+                    },
+                },
+                {"name": "Testing", "sessions": {"practice 1": datetime(2030, 3, 5, 10)}},
+                {
+                    "name": "Second",
+                    "sessions": {
+                        "qualifying": datetime(2030, 3, 9, 15),
+                        "race": datetime(2030, 3, 10, 14),
+                    },
+                },
+            ]
+        )
+
+    def test_next_race(self):
+        self.assertEqual(self.season.next_race(datetime(2030, 1, 1))["name"], "First")
+        self.assertEqual(self.season.next_race(datetime(2030, 3, 3, 14))["name"], "First")
+        self.assertEqual(self.season.next_race(datetime(2030, 3, 4))["name"], "Second")
+        # Last race weekend once the season is over
+        self.assertEqual(self.season.next_race(datetime(2031, 1, 1))["name"], "Second")
+
+    def test_next_session(self):
+        race_weekend, session, date = self.season.next_session(datetime(2030, 3, 4))
+        self.assertEqual((race_weekend["name"], session), ("Testing", "practice 1"))
+        self.assertEqual(date, datetime(2030, 3, 5, 10))
+
+        race_weekend, session, _ = self.season.next_session(datetime(2030, 3, 2), "practice 1")
+        self.assertEqual((race_weekend["name"], session), ("Testing", "practice 1"))
+        self.assertEqual(
+            self.season.next_session(datetime(2030, 3, 4), "race")[2], datetime(2030, 3, 10, 14)
+        )
+        self.assertIsNone(self.season.next_session(datetime(2030, 3, 6), "practice 1"))
+        self.assertIsNone(self.season.next_session(datetime(2031, 1, 1)))
+
+
+def create_results_table(names):
+    rows = "".join(
+        f"<tr><td>{i}</td><td>{i}</td><td>{name}</td><td>Team</td><td>57</td>"
+        f"<td>1:30:0{i}</td><td>25</td></tr>"
+        for i, name in enumerate(names, start=1)
+    )
+    return Selector(
+        text="<div id='results-table'><table><tr><th>Pos.</th><th>No.</th><th>Driver</th>"
+        "<th>Team</th><th>Laps</th><th>Time / Retired</th><th>Pts.</th></tr>"
+        f"{rows}<tr><td>Footer</td></tr></table></div>"
+    ).xpath("//div")[0]
+
+
+class TestFormulaResults(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        formularace._calendar_cache.clear()
+        formularesults._results.clear()
+        formularesults._unpublished_rounds.clear()
+        self.pages = {}
+        self.fetched = []
+        res = create_response(200, CALENDAR, {"ETag": '"v1"'})
+        patchers = [
+            patch.object(formularace, "cache_backend", FileBackend(self.tmp_dir.name)),
+            patch.object(formularesults, "cache_backend", FileBackend(self.tmp_dir.name)),
+            patch.object(FormulaRace, "CALENDAR_URL", "https://calendar.test"),
+            patch.object(formularace, "get", AsyncMock(return_value=res)),
+            patch.object(formularesults, "find_element", self.find_element),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        formularace._calendar_cache.clear()
+        formularesults._results.clear()
+        self.tmp_dir.cleanup()
+
+    async def find_element(self, url, tag, id=None):
+        self.fetched.append(url)
+        return self.pages.get(url)
+
+    def set_races(self, *races):
+        links = "".join(
+            f"<tr><td><a href='/races/{race}/race-result'>x</a></td></tr>" for race in races
+        )
+        self.pages["https://www.formula1.com/en/results/2030/races"] = Selector(
+            text=f"<div id='results-table'><table>{links}</table></div>"
+        ).xpath("//div")[0]
+        for race in races:
+            self.pages[f"https://www.formula1.com/races/{race}/race-result"] = create_results_table(
+                [f"Driver {race} AAA", f"Driver {race} BBB"]
+            )
+
+    async def get_results(self, date):
+        formula_results = FormulaResults()
+        formula_results.date = date
+        return await formula_results.get_results()
+
+    async def test_results_are_fetched_once_per_round(self):
+        self.set_races("first")
+        results = await self.get_results(datetime(2030, 3, 5))
+        self.assertEqual(results["url"], "https://www.formula1.com/races/first/race-result")
+        self.assertEqual(
+            results["results"][0], {"name": "Driver first AAA", "position": "1", "time": "1:30:01"}
+        )
+        self.assertEqual(len(self.fetched), 2)
+
+        # Nothing new has completed between race weekends
+        self.fetched.clear()
+        self.assertEqual(await self.get_results(datetime(2030, 3, 10, 15)), results)
+        self.assertEqual(self.fetched, [])
+
+        # Results of the new round are not published yet, index is checked again later
+        self.assertEqual(await self.get_results(datetime(2030, 3, 10, 18)), results)
+        self.assertEqual(await self.get_results(datetime(2030, 3, 10, 18)), results)
+        self.assertEqual(len(self.fetched), 1)
+
+        self.fetched.clear()
+        formularesults._unpublished_rounds.clear()
+        self.set_races("first", "second")
+        results = await self.get_results(datetime(2030, 3, 10, 18))
+        self.assertEqual(results["url"], "https://www.formula1.com/races/second/race-result")
+        self.assertEqual(len(self.fetched), 2)
+
+        # Ingested rounds survive a restart through the file store
+        self.fetched.clear()
+        formularesults._results.clear()
+        self.assertEqual(await self.get_results(datetime(2030, 3, 20)), results)
+        self.assertEqual(self.fetched, [])
+
+    async def test_results_matched_by_race_not_row(self):
+        # Index without a row for the first race
+        self.set_races("second")
+        results = await self.get_results(datetime(2030, 3, 20))
+        self.assertEqual(results["url"], "https://www.formula1.com/races/second/race-result")
+
+        self.set_races("other", "first")
+        formularesults._results.clear()
+        results = await self.get_results(datetime(2030, 3, 5))
+        self.assertEqual(results["url"], "https://www.formula1.com/races/first/race-result")
+
+    async def test_concurrent_requests_share_ingestion(self):
+        self.set_races("first")
+        results = await asyncio.gather(*(self.get_results(datetime(2030, 3, 5)) for _ in range(3)))
+        self.assertEqual(len(self.fetched), 2)
+        self.assertEqual(results[1:], results[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
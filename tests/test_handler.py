@@ -0,0 +1,171 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("TELEGRAM_TOKEN", "test-token")
+
+from src import command, handler  # noqa: E402
+from src.command import Command, Response, ResponseType  # noqa: E402
+from src.common.backends import MemoryBackend, SQLiteBackend  # noqa: E402
+from src.common.cache import TTLCache  # noqa: E402
+
+
+def create_event(text):
+    update = {"update_id": 1, "message": {"text": text, "chat": {"id": 123}}}
+    return {"requestContext": {"http": {"method": "POST"}}, "body": json.dumps(update)}
+
+
+class TestHandler(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.bot = MagicMock()
+        self.bot.send_text = AsyncMock()
+        patcher = patch.object(handler, "get_bot", AsyncMock(return_value=self.bot))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_reply_in_webhook_response(self):
+        with patch.object(handler, "WEBHOOK_REPLY", True):
+            result = await handler.webhook_async(create_event("/bot"), None)
+        body = json.loads(result["body"])
+        self.assertEqual(body["method"], "sendMessage")
+        self.assertEqual(body["chat_id"], 123)
+        self.bot.send_text.assert_not_called()
+
+    async def test_reply_with_api_call(self):
+        with patch.object(handler, "WEBHOOK_REPLY", False):
+            result = await handler.webhook_async(create_event("/bot"), None)
+        self.assertEqual(json.loads(result["body"]), "Event handled")
+        self.bot.send_text.assert_awaited_once()
+
+    def test_webhook_reply_for_image(self):
+        res = Response(text="caption", image="https://image.test/a.png", type=ResponseType.IMAGE)
+        reply = handler.create_webhook_reply(1, res)
+        self.assertEqual(reply["method"], "sendPhoto")
+        self.assertEqual(reply["photo"], "https://image.test/a.png")
+
+    def test_webhook_reply_not_possible(self):
+        uploaded = Response(image=BytesIO(b"image"), type=ResponseType.IMAGE)
+        too_long = Response(text="a" * (handler.MAX_TEXT_LENGTH + 1))
+        self.assertIsNone(handler.create_webhook_reply(1, uploaded))
+        self.assertIsNone(handler.create_webhook_reply(1, too_long))
+
+    async def test_command_timeout_from_context(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 10000
+        with (
+            patch.object(handler, "WEBHOOK_REPLY", True),
+            patch.object(handler, "Command", wraps=Command) as command_class,
+        ):
+            await handler.webhook_async(create_event("/bot"), context)
+        self.assertEqual(command_class.call_args.kwargs["timeout"], 10 - handler.REPLY_MARGIN)
+
+    async def test_background_drain_capped(self):
+        context = MagicMock()
+        context.get_remaining_time_in_millis.return_value = 14000
+        with patch.object(handler.background, "drain", AsyncMock()) as drain:
+            await handler.drain_background_tasks(context)
+            context.get_remaining_time_in_millis.return_value = 3000
+            await handler.drain_background_tasks(context)
+        self.assertEqual(
+            [call.args[0] for call in drain.await_args_list],
+            [handler.BACKGROUND_TIMEOUT, 3 - handler.BACKGROUND_MARGIN],
+        )
+
+    async def test_no_command(self):
+        result = await handler.webhook_async(create_event("hello"), None)
+        self.assertEqual(json.loads(result["body"]), "Event handled")
+        handler.get_bot.assert_not_called()
+
+    def test_cold_start_imports(self):
+        heavy_modules = ["telegram", "icalendar", "parsel", "lxml", "httpx"]
+        code = (
+            "import sys, src.handler; "
+            f"print(','.join(m for m in {heavy_modules!r} if m in sys.modules))"
+        )
+        env = os.environ | {"TELEGRAM_TOKEN": "test-token"}
+        root = Path(__file__).resolve().parent.parent
+        res = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, cwd=root, env=env
+        )
+        self.assertEqual(res.returncode, 0, res.stderr)
+        self.assertEqual(res.stdout.strip(), "")
+
+
+async def command_response(cmd):
+    if cmd.text == Command.F1_RACE_CMD:
+        return Response(text="race", image="https://image.test/a.png", type=ResponseType.IMAGE)
+    return Response(text=cmd.text)
+
+
+class TestRefresh(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.backend = SQLiteBackend(self.tmp_dir.name)
+        patchers = [
+            patch.object(command, "cache_backend", self.backend),
+            patch.object(handler, "cache_backend", self.backend),
+            patch.object(command, "response_cache", TTLCache()),
+            patch.object(Command, "refresh_lookups", AsyncMock()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    async def test_refresh_writes_responses_to_shared_cache(self):
+        with patch.object(Command, "_command_response", command_response):
+            result = await handler.refresh_async({}, None)
+        self.assertEqual(result["statusCode"], 200)
+        Command.refresh_lookups.assert_awaited_once()
+
+        # Webhook of another container serves replies straight from shared cache
+        uncached_response = AsyncMock()
+        with (
+            patch.object(command, "response_cache", TTLCache()),
+            patch.object(Command, "_command_response", uncached_response),
+        ):
+            race = await Command("/f1race ").get_response()
+            scoring = await Command("/nhlscoring").get_response()
+        uncached_response.assert_not_awaited()
+        self.assertEqual(
+            (race.text, race.image, race.type),
+            ("race", "https://image.test/a.png", ResponseType.IMAGE),
+        )
+        self.assertEqual(scoring.text, "/nhlscoring")
+
+    async def test_refresh_skipped_without_shared_backend(self):
+        uncached_response = AsyncMock()
+        with (
+            patch.object(handler, "cache_backend", MemoryBackend()),
+            patch.object(Command, "_command_response", uncached_response),
+        ):
+            result = await handler.refresh_async({}, None)
+        self.assertEqual(json.loads(result["body"]), "Refresh skipped")
+        uncached_response.assert_not_awaited()
+        Command.refresh_lookups.assert_not_awaited()
+
+    async def test_refresh_failure(self):
+        async def command_response(cmd):
+            if cmd.text == Command.F1_RESULTS_CMD:
+                raise Exception("Scraping failed")
+            return Response(text=cmd.text)
+
+        with patch.object(Command, "_command_response", command_response):
+            result = await handler.refresh_async({}, None)
+        self.assertEqual(result["statusCode"], 500)
+        key = Command("/f1standings")._cache_key()
+        self.assertIsNotNone(await self.backend.get(f"response:{key}"))
+        key = Command("/f1results")._cache_key()
+        self.assertIsNone(await self.backend.get(f"response:{key}"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,324 @@
+import asyncio
+import tempfile
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+from parsel import Selector
+from src.common import deadline
+from src.common.backends import FileBackend, MemoryBackend
+from src.nhl import nhlbase, nhlcontract, nhlscoring
+from src.nhl.nhlbase import NHLBase
+from src.nhl.nhlcontract import NHLContract
+from src.nhl.nhlplayers import PlayerIndex, slugify_name
+from src.nhl.nhlskaters import SkaterTable
+from src.nhl.nhlscoring import NHLScoring
+
+FRANCHISES = {
+    "data": [
+        {"id": 14, "fullName": "Tampa Bay Lightning"},
+        {"id": 24, "fullName": "Edmonton Oilers"},
+        {"id": 99, "fullName": "Hamilton Tigers"},
+    ]
+}
+
+
+def create_skater(player_id, name, team, nationality, position, games, goals, assists):
+    return {
+        "playerId": player_id,
+        "lastName": name,
+        "skaterFullName": f"First {name}",
+        "teamAbbrevs": team,
+        "nationalityCode": nationality,
+        "positionCode": position,
+        "gamesPlayed": games,
+        "goals": goals,
+        "assists": assists,
+        "points": goals + assists,
+    }
+
+
+SKATERS = [
+    create_skater(1, "Kucherov", "TBL", "RUS", "R", 60, 30, 60),
+    create_skater(2, "McDavid", "EDM", "CAN", "C", 58, 35, 55),
+    create_skater(3, "Rantanen", "COL,CAR", "FIN", "R", 61, 32, 50),
+    create_skater(4, "Aho", "CAR", "FIN", "C", 20, 30, 52),
+    create_skater(5, "Hedman", "TBL", "SWE", "D", 62, 10, 50),
+]
+
+
+def create_json_response(data):
+    res = MagicMock()
+    res.json.return_value = data
+    return res
+
+
+class TestNHLBase(unittest.TestCase):
+    def test_teams_shared_and_read_only(self):
+        first, second = NHLBase(), NHLBase()
+        self.assertIs(first.teams, second.teams)
+        with self.assertRaises(TypeError):
+            first.teams["TBL"] = "Somebody Else"
+
+    def test_find_team(self):
+        nhl_base = NHLBase()
+        self.assertEqual(nhl_base.find_team("tbl"), "TBL")
+        self.assertEqual(nhl_base.find_team("tampa  bay LIGHTNING"), "TBL")
+        self.assertEqual(nhl_base.find_team("Lightning"), "TBL")
+        self.assertIsNone(nhl_base.find_team("FIN"))
+        self.assertIsNone(nhl_base.find_team(None))
+
+
+class TestSkaterTable(unittest.TestCase):
+    def setUp(self):
+        self.table = SkaterTable()
+        for skater in SKATERS:
+            self.table.append(skater)
+
+    def test_top_ordered_by_points_goals_assists(self):
+        leaders = [self.table.row(i)["name"] for i in self.table.top(3)]
+        self.assertEqual(leaders, ["McDavid", "Kucherov", "Rantanen"])
+
+    def test_dict_round_trip(self):
+        table = SkaterTable.from_dict(self.table.to_dict())
+        self.assertEqual(table.top(10), self.table.top(10))
+        self.assertEqual(table.row(0), self.table.row(0))
+
+    def test_filters(self):
+        def names(**filters):
+            return [self.table.row(i)["name"] for i in self.table.top(10, **filters)]
+
+        self.assertEqual(names(team="CAR"), ["Rantanen", "Aho"])
+        self.assertEqual(names(nationality="FIN", min_games=40), ["Rantanen"])
+        self.assertEqual(names(team="TBL", position="D"), ["Hedman"])
+        self.assertEqual(names(nationality="USA"), [])
+
+
+class TestNHLScoring(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        nhlscoring._franchise_index.clear()
+        self.addCleanup(nhlscoring._franchise_index.clear)
+        patcher = patch.object(nhlscoring, "_franchise_index_failed_at", 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        res = MagicMock()
+        res.json.return_value = FRANCHISES
+        self.get = AsyncMock(return_value=res)
+        patchers = [
+            patch.object(nhlscoring, "cache_backend", FileBackend(self.tmp_dir.name)),
+            patch.object(nhlscoring, "get", self.get),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_team_filter_uses_franchise_index(self):
+        nhl_scoring = NHLScoring()
+        self.assertEqual(await nhl_scoring._create_filter("tbl"), 'and franchiseId="14"')
+        self.assertEqual(await nhl_scoring._create_filter("EDM"), 'and franchiseId="24"')
+        self.assertEqual(self.get.await_count, 1)
+
+    async def test_franchise_index_persisted(self):
+        await NHLScoring()._create_filter("TBL")
+        nhlscoring._franchise_index.clear()
+        self.assertEqual(await NHLScoring()._create_filter("EDM"), 'and franchiseId="24"')
+        self.assertEqual(self.get.await_count, 1)
+
+    async def test_team_filter_by_nickname(self):
+        nhl_scoring = NHLScoring()
+        team = nhl_scoring._sanitize_filter("oilers")
+        self.assertEqual(await nhl_scoring._create_filter(team), 'and franchiseId="24"')
+
+    async def test_failed_franchise_index_raises_and_backs_off(self):
+        self.get.side_effect = RuntimeError("API down")
+        with self.assertRaises(LookupError):
+            await NHLScoring()._create_filter("TBL")
+        with self.assertRaises(LookupError):
+            await NHLScoring()._create_filter("EDM")
+        self.assertEqual(self.get.await_count, 1)
+        self.assertIsNone(await NHLScoring()._query_scoring_leaders(10, "EDM"))
+        self.assertEqual(self.get.await_count, 1)
+
+    async def test_last_good_franchise_index_served_when_refresh_fails(self):
+        await NHLScoring()._create_filter("TBL")
+        nhlscoring._franchise_index["updatedAt"] = 0
+        self.get.side_effect = RuntimeError("API down")
+        self.assertEqual(await NHLScoring()._create_filter("EDM"), 'and franchiseId="24"')
+
+    async def test_nationality_filter_skips_franchise_lookup(self):
+        self.assertEqual(await NHLScoring()._create_filter("FIN"), 'and nationalityCode="FIN"')
+        self.get.assert_not_awaited()
+
+
+class TestNHLScoringLeaders(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        nhlscoring._skater_tables.clear()
+        self.addCleanup(nhlscoring._skater_tables.clear)
+        self.get = AsyncMock(side_effect=self._get_page)
+        self.backend = MemoryBackend()
+        patchers = [
+            patch.object(nhlbase, "get", self.get),
+            patch.object(nhlscoring, "cache_backend", self.backend),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def _get_page(self, url, params=None):
+        start, end = params["start"], params["start"] + params["limit"]
+        return create_json_response({"data": SKATERS[start:end], "total": len(SKATERS)})
+
+    async def test_filters_answered_from_season_table(self):
+        nhl_scoring = NHLScoring()
+        nhl_scoring.page_size = 2
+        leaders = await nhl_scoring.get_scoring_leaders(2)
+        self.assertEqual([player["name"] for player in leaders], ["McDavid", "Kucherov"])
+        self.assertEqual(leaders[0]["rank"], 1)
+        pages = self.get.await_count
+
+        finns = await nhl_scoring.get_scoring_leaders(10, "fin")
+        tampa = await nhl_scoring.get_scoring_leaders(10, "lightning")
+        self.assertEqual([player["name"] for player in finns], ["Rantanen", "Aho"])
+        self.assertEqual([player["name"] for player in tampa], ["Kucherov", "Hedman"])
+        self.assertEqual(pages, 3)
+        self.assertEqual(self.get.await_count, pages)
+
+    async def test_season_table_shared_through_cache_backend(self):
+        await NHLScoring().get_scoring_leaders(2)
+        # Another container finds the snapshot without fetching pages
+        nhlscoring._skater_tables.clear()
+        leaders = await NHLScoring().get_scoring_leaders(2, "car")
+        self.assertEqual(self.get.await_count, 1)
+        self.assertEqual([player["name"] for player in leaders], ["Rantanen", "Aho"])
+
+    async def test_query_fetches_pages_up_to_amount(self):
+        nhl_scoring = NHLScoring()
+        nhl_scoring.page_size = 2
+        leaders = await nhl_scoring._query_scoring_leaders(4, None)
+        self.assertEqual(self.get.await_count, 2)
+        self.assertEqual([player["rank"] for player in leaders], [1, 2, 3, 4])
+        self.assertEqual(leaders[0]["name"], "McDavid")
+
+    async def test_amount_capped(self):
+        skaters = [
+            create_skater(i, f"Player{i}", "TBL", "FIN", "C", 10, 10, 200 - i) for i in range(150)
+        ]
+
+        async def get_page(url, params=None):
+            start, end = params["start"], params["start"] + params["limit"]
+            return create_json_response({"data": skaters[start:end], "total": len(skaters)})
+
+        self.get.side_effect = get_page
+        nhl_scoring = NHLScoring()
+        leaders = await nhl_scoring.get_scoring_leaders(150)
+        self.assertEqual(len(leaders), nhlscoring.MAX_LEADERS)
+        self.assertLessEqual(len(nhl_scoring.format(leaders)), 4096)
+
+    async def test_no_leaders_when_out_of_time(self):
+        async def slow_page(url, params=None):
+            await asyncio.sleep(1)
+
+        self.get.side_effect = slow_page
+        with deadline.limit(0.05):
+            self.assertIsNone(await NHLScoring().get_scoring_leaders(10, "fin"))
+
+
+class TestPlayerIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PlayerIndex(
+            [
+                "Connor McDavid",
+                "Andrei Vasilevskiy",
+                "Leon Draisaitl",
+                "Tim Stützle",
+                "Brady Tkachuk",
+                "Matthew Tkachuk",
+                "Ryan O'Reilly",
+            ]
+        )
+
+    def test_resolve(self):
+        self.assertEqual(self.index.resolve("connor  mcdavid"), "Connor McDavid")
+        self.assertEqual(self.index.resolve("mcdavid"), "Connor McDavid")
+        self.assertEqual(self.index.resolve("vasilevsky"), "Andrei Vasilevskiy")
+        self.assertEqual(self.index.resolve("draisatl"), "Leon Draisaitl")
+        self.assertEqual(self.index.resolve("tim stutzle"), "Tim Stützle")
+
+    def test_not_resolved(self):
+        self.assertIsNone(self.index.resolve("tkachuk"))
+        self.assertIsNone(self.index.resolve("wayne gretzky"))
+        # Full names are never matched to a similar player
+        self.assertIsNone(self.index.resolve("conor mcdavid"))
+        self.assertIsNone(self.index.resolve("matt tkachuk"))
+        self.assertIsNone(self.index.resolve(""))
+
+    def test_slugify_name(self):
+        self.assertEqual(slugify_name("Tim Stützle"), "tim-stutzle")
+        self.assertEqual(slugify_name("Ryan O'Reilly"), "ryan-oreilly")
+        self.assertEqual(slugify_name("Oliver Ekman-Larsson"), "oliver-ekman-larsson")
+
+
+class TestNHLContract(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        nhlcontract._unresolved_names.clear()
+        self.addCleanup(nhlcontract._unresolved_names.clear)
+        nhlcontract._player_index.update(
+            {
+                "season": NHLContract().season,
+                "updatedAt": time.time(),
+                "index": PlayerIndex(["Connor McDavid", "Tim Stützle"]),
+            }
+        )
+        self.addCleanup(nhlcontract._player_index.clear)
+        self.urls = []
+        patcher = patch.object(nhlcontract, "stream_elements", self._stream_tables)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def _stream_tables(self, url, *args, **kwargs):
+        self.urls.append(url)
+        season = NHLContract().season
+        html = (
+            "<table><tr><th>Season</th></tr>"
+            f"<tr><td>{season[:4]}-{season[6:]}</td><td>ELC</td><td>$1,000,000</td></tr>"
+            "<tr><td>Total</td></tr></table>"
+        )
+        yield Selector(text=html).xpath("//table")[0]
+
+    async def test_name_resolved_before_fetch(self):
+        data = await NHLContract().get("stützle")
+        self.assertEqual(self.urls, ["https://capwages.com/players/tim-stutzle"])
+        self.assertEqual(data["contract"], {"yearStatus": "1/1", "capHit": "$1,000,000"})
+
+    async def test_full_name_resolved_without_index(self):
+        nhlcontract._player_index.clear()
+        with patch.object(NHLContract, "_fetch_player_index", AsyncMock()) as fetch:
+            data = await NHLContract().get("Conor McDavid")
+        fetch.assert_not_awaited()
+        self.assertEqual(self.urls, ["https://capwages.com/players/conor-mcdavid"])
+        self.assertIsNotNone(data)
+
+    async def test_refreshed_player_index_shared_through_cache_backend(self):
+        backend = MemoryBackend()
+        index = PlayerIndex(["Leon Draisaitl"])
+        with (
+            patch.object(nhlcontract, "cache_backend", backend),
+            patch.object(NHLContract, "_fetch_player_index", AsyncMock(return_value=index)),
+        ):
+            await NHLContract().refresh_player_index()
+            nhlcontract._player_index.clear()
+            NHLContract._fetch_player_index.reset_mock()
+            await NHLContract().get("draisaitl")
+            NHLContract._fetch_player_index.assert_not_awaited()
+        self.assertEqual(self.urls, ["https://capwages.com/players/leon-draisaitl"])
+
+    async def test_unresolved_name_negatively_cached(self):
+        self.assertIsNone(await NHLContract().get("nobody"))
+        self.assertIsNone(await NHLContract().get("Nobody"))
+        self.assertEqual(self.urls, [])
+        self.assertIn("nobody", nhlcontract._unresolved_names)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+import asyncio
+import unittest
+from src.common.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.flights = SingleFlight("Test")
+        self.calls = []
+
+    async def fetch(self, value, event=None):
+        self.calls.append(value)
+        if event is not None:
+            await event.wait()
+        if value is None:
+            raise ValueError("No value")
+        return value
+
+    async def test_concurrent_calls_share_flight(self):
+        event = asyncio.Event()
+        callers = [self.flights.do("key", self.fetch, "a", event) for _ in range(3)]
+        callers.append(self.flights.do("other", self.fetch, "b", event))
+        tasks = [asyncio.ensure_future(caller) for caller in callers]
+        await asyncio.sleep(0)
+        self.assertEqual(len(self.flights), 2)
+        event.set()
+        self.assertEqual(await asyncio.gather(*tasks), ["a", "a", "a", "b"])
+        self.assertEqual(self.calls, ["a", "b"])
+        self.assertEqual(self.flights.stats(), {"flights": 2, "callers": 4, "inFlight": 0})
+
+    async def test_sequential_calls_are_not_coalesced(self):
+        self.assertEqual(await self.flights.do("key", self.fetch, "a"), "a")
+        self.assertEqual(await self.flights.do("key", self.fetch, "b"), "b")
+        self.assertEqual(self.calls, ["a", "b"])
+
+    async def test_error_is_shared(self):
+        event = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(self.flights.do("key", self.fetch, None, event)) for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        event.set()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+        self.assertEqual(len(self.calls), 1)
+
+    async def test_logged_key_described(self):
+        flights = SingleFlight("Test", describe=lambda key: key[0])
+        event = asyncio.Event()
+        tasks = [
+            asyncio.ensure_future(flights.do(("url", "secret"), self.fetch, "a", event))
+            for _ in range(2)
+        ]
+        await asyncio.sleep(0)
+        event.set()
+        with self.assertLogs("src.common.singleflight", level="INFO") as logs:
+            await asyncio.gather(*tasks)
+        self.assertEqual(
+            logs.output, ["INFO:src.common.singleflight:Test flight served 2 callers: url"]
+        )
+
+    async def test_cancelled_caller_does_not_cancel_flight(self):
+        event = asyncio.Event()
+        first = asyncio.ensure_future(self.flights.do("key", self.fetch, "a", event))
+        second = asyncio.ensure_future(self.flights.do("key", self.fetch, "a", event))
+        await asyncio.sleep(0)
+        first.cancel()
+        event.set()
+        self.assertEqual(await second, "a")
+        self.assertTrue(first.cancelled())
+
+
+if __name__ == "__main__":
+    unittest.main()
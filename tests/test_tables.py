@@ -0,0 +1,53 @@
+import unittest
+from parsel import Selector
+from src.common.tables import Column, TableExtractor
+
+TABLE = """
+<table>
+    <thead><tr><th>Pos.</th><th>No.</th><th>Driver</th><th>Laps</th><th>Time / Retired</th><th>Pts.</th></tr></thead>
+    <tbody>
+        <tr><td>1</td><td>4</td><td><span>Lando</span> <span>Norris</span> <span>NOR</span></td><td>57</td><td>1:42:06.304</td><td>25</td></tr>
+        <tr><td>2</td><td>1</td><td>Max Verstappen VER</td><td>57</td><td>+22.457s</td><td>18</td></tr>
+        <tr><td colspan="6">Fastest lap</td></tr>
+        <tr><td>NC</td><td>81</td><td>Oscar Piastri PIA</td><td>0</td><td>DNF</td><td>0</td></tr>
+    </tbody>
+</table>
+"""
+
+
+class TestTableExtractor(unittest.TestCase):
+    def setUp(self):
+        self.table = Selector(text=TABLE).xpath("//table")[0]
+
+    def test_columns_mapped_by_header(self):
+        extractor = TableExtractor(
+            [
+                Column("points", "Pts", 0, float),
+                Column("position", "Pos", 5),
+                Column("time", "Time", 0),
+            ]
+        )
+        rows = extractor.extract(self.table)
+        self.assertEqual(rows[0], (25.0, "1", "1:42:06.304"))
+        self.assertEqual(len(rows), 3)
+
+    def test_columns_by_index(self):
+        extractor = TableExtractor(
+            [Column("position", index=0), Column("name", index=2), Column("time", index=-2)],
+            skip_footer=True,
+            min_cells=4,
+        )
+        rows = extractor.extract(self.table.root)
+        self.assertEqual(
+            rows,
+            [("1", "Lando Norris NOR", "1:42:06.304"), ("2", "Max Verstappen VER", "+22.457s")],
+        )
+
+    def test_missing_column(self):
+        extractor = TableExtractor([Column("team", "Team")])
+        with self.assertRaises(ValueError):
+            extractor.extract(self.table)
+
+
+if __name__ == "__main__":
+    unittest.main()
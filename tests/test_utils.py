@@ -1,7 +1,15 @@
+import asyncio
 import unittest
 from datetime import datetime
+from unittest.mock import patch
+import httpx
 from ddt import ddt, data, unpack
+from src.common import background, deadline, utils
 from src.common.utils import (
+    find_element,
+    get,
+    get_client,
+    stream_elements,
     find_first_integer,
     find_first_word,
     convert_timezone,
@@ -86,6 +94,214 @@ class TestUtils(unittest.TestCase):
         self.assertIsInstance(result, str)
         self.assertEqual(result, "2010-10-10 12:12:12.123000")
 
+    def test_get_client_pooled_per_host(self):
+        async def clients():
+            return (
+                get_client("https://www.formula1.com/en/results"),
+                get_client("https://www.formula1.com/en/racing"),
+                get_client("https://api.nhle.com/stats/rest/en/franchise"),
+            )
+
+        first, second, other = asyncio.run(clients())
+        self.assertIs(first, second)
+        self.assertIsNot(first, other)
+
+
+class TestGet(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        utils.http_cache.entries.clear()
+        self.requests = []
+
+    def tearDown(self):
+        utils.http_cache.entries.clear()
+
+    def _client(self, handler):
+        def record(request):
+            self.requests.append(request)
+            return handler(request)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(record))
+
+    async def test_fresh_response_served_from_cache(self):
+        client = self._client(
+            lambda _: httpx.Response(200, content=b"body", headers={"Cache-Control": "max-age=60"})
+        )
+        with patch.object(utils, "get_client", return_value=client):
+            first = await get("https://example.test/page")
+            second = await get("https://example.test/page")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(first.content, second.content)
+
+    async def test_concurrent_requests_coalesced(self):
+        client = self._client(lambda _: httpx.Response(200, content=b"body"))
+        with patch.object(utils, "get_client", return_value=client):
+            responses = await asyncio.gather(*(get("https://example.test/page") for _ in range(3)))
+            await get("https://example.test/page", headers={"Accept": "text/html"})
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual([res.content for res in responses], [b"body"] * 3)
+
+    async def test_coalesced_callers_get_own_responses(self):
+        client = self._client(
+            lambda _: httpx.Response(
+                200, content="päivä".encode("latin-1"), headers={"Content-Type": "text/html"}
+            )
+        )
+        with patch.object(utils, "get_client", return_value=client):
+            first, second = await asyncio.gather(
+                *(get("https://example.test/page") for _ in range(2))
+            )
+            selector = await utils.set_selector("https://example.test/page")
+        self.assertIsNot(first, second)
+        self.assertIsInstance(first.text, str)
+        second.encoding = "latin-1"
+        self.assertEqual(second.text, "päivä")
+        self.assertEqual(selector.xpath("string()").get(), "päivä")
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_request_bounded_by_deadline(self):
+        async def slow(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, content=b"body")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        with patch.object(utils, "get_client", return_value=client), deadline.limit(0.05):
+            with self.assertRaises(asyncio.TimeoutError):
+                await get("https://example.test/slow")
+
+    async def test_joiner_not_bound_by_first_caller_deadline(self):
+        async def slow(request):
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, content=b"body")
+
+        async def get_with_deadline(seconds):
+            with deadline.limit(seconds):
+                return await get("https://example.test/slow")
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        with patch.object(utils, "get_client", return_value=client):
+            first, second = await asyncio.gather(
+                get_with_deadline(0.02), get_with_deadline(5), return_exceptions=True
+            )
+        self.assertIsInstance(first, asyncio.TimeoutError)
+        self.assertEqual(second.content, b"body")
+
+    async def test_stream_bounded_by_deadline(self):
+        async def body():
+            yield b"<div>"
+            await asyncio.sleep(1)
+            yield b"</div>"
+
+        client = self._client(lambda _: httpx.Response(200, content=body()))
+        with patch.object(utils, "get_client", return_value=client), deadline.limit(0.05):
+            with self.assertRaises(asyncio.TimeoutError):
+                await find_element("https://example.test/page", "div")
+
+    async def test_no_request_after_deadline(self):
+        client = self._client(lambda _: httpx.Response(200, content=b"body"))
+        with patch.object(utils, "get_client", return_value=client), deadline.limit(0):
+            with self.assertRaises(TimeoutError):
+                await get("https://example.test/page")
+        self.assertEqual(self.requests, [])
+
+    async def test_stale_response_revalidated(self):
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=b"body", headers={"ETag": '"v1"'})
+
+        with patch.object(utils, "get_client", return_value=self._client(handler)):
+            await get("https://example.test/page")
+            res = await get("https://example.test/page")
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.content, b"body")
+
+    async def test_find_element_stops_reading_after_match(self):
+        html = (
+            b"<html><body><div id='other'>a</div>"
+            + b"<div id='results-table'><table><tr><td>1</td></tr></table></div>"
+            + b"<div>rest</div>" * 1000
+            + b"</body></html>"
+        )
+        chunks = [html[i:][:1000] for i in range(0, len(html), 1000)]
+        sent = []
+
+        async def body():
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+        client = self._client(lambda _: httpx.Response(200, content=body()))
+        with patch.object(utils, "get_client", return_value=client):
+            container = await find_element("https://example.test/page", "div", id="results-table")
+        self.assertEqual(container.xpath(".//td/text()").get(), "1")
+        self.assertLess(len(sent), len(chunks))
+
+    async def test_concurrent_streams_coalesced(self):
+        html = b"<table><tr><td>1</td></tr></table><div>2</div>" + b"<p>rest</p>" * 100
+
+        async def body():
+            for i in range(0, len(html), 100):
+                await asyncio.sleep(0)
+                yield html[i:][:100]
+
+        client = self._client(lambda _: httpx.Response(200, content=body()))
+        with patch.object(utils, "get_client", return_value=client):
+            elements = await asyncio.gather(
+                *(find_element("https://example.test/page", tag) for tag in ["table", "div"] * 3)
+            )
+            await find_element("https://example.test/page", "table")
+        self.assertEqual([e.xpath("string()").get() for e in elements], ["1", "2"] * 3)
+        # Page can't be cached, so only a later call fetches it again
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(utils._bodies, {})
+
+    async def test_stream_elements_by_class(self):
+        html = (
+            b"<table class='a bg-white min-w-full'><tr><td>1</td></tr></table>"
+            + b"<table class='bg-white'><tr><td>2</td></tr></table>"
+            + b"<table class='min-w-full bg-white'><tr><td>3</td></tr></table>"
+        )
+        client = self._client(lambda _: httpx.Response(200, content=html))
+        with patch.object(utils, "get_client", return_value=client):
+            tables = [
+                table.xpath("string()").get()
+                async for table in stream_elements(
+                    "https://example.test/page", "table", classes=["min-w-full", "bg-white"]
+                )
+            ]
+        self.assertEqual(tables, ["1", "3"])
+
+    async def test_streamed_page_cached_and_revalidated(self):
+        html = b"<table><tr><td>1</td></tr></table>"
+
+        def handler(request):
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304, headers={"Cache-Control": "max-age=60"})
+            return httpx.Response(200, content=html, headers={"ETag": '"v1"'})
+
+        with patch.object(utils, "get_client", return_value=self._client(handler)):
+            tables = []
+            for _ in range(3):
+                tables.append(await find_element("https://example.test/page", "table"))
+                await background.drain(1)
+        self.assertEqual([table.xpath("string()").get() for table in tables], ["1"] * 3)
+        # Stored body is revalidated once and then served while fresh
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(self.requests[1].headers["If-None-Match"], '"v1"')
+
+    async def test_rest_of_page_read_in_background_for_cache(self):
+        html = b"<table><tr><td>1</td></tr></table>" + b"<div>rest</div>" * 100
+        client = self._client(
+            lambda _: httpx.Response(200, content=html, headers={"Cache-Control": "max-age=60"})
+        )
+        with patch.object(utils, "get_client", return_value=client):
+            await find_element("https://example.test/page", "table")
+            await background.drain(1)
+            await find_element("https://example.test/page", "table")
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(utils.http_cache.lookup("https://example.test/page", {})["content"], html)
+
 
 if __name__ == "__main__":
     unittest.main()
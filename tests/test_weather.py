@@ -0,0 +1,138 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+os.environ.setdefault("OPENWEATHER_API_KEY", "test-key")
+
+from src.common.backends import FileBackend, MemoryBackend  # noqa: E402
+from src.common.cache import TTLCache  # noqa: E402
+from src.common.singleflight import SingleFlight  # noqa: E402
+from src.other import weathersearch  # noqa: E402
+from src.other.weathersearch import WeatherSearch, location_key  # noqa: E402
+
+
+def create_response(data):
+    res = MagicMock()
+    res.json.return_value = data
+    return res
+
+
+TAMPERE = {
+    "status": "OK",
+    "results": [{"geometry": {"location": {"lat": 61.4978, "lng": 23.761}}}],
+}
+
+
+class TestGeocodeCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patchers = [
+            patch.object(weathersearch, "cache_backend", FileBackend(self.tmp_dir.name)),
+            patch.object(weathersearch, "_geocodes", TTLCache(max_entries=1024)),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_location_key(self):
+        self.assertEqual(location_key("  Tampere ", "FI"), location_key("TAMPERE", "fi"))
+        self.assertEqual(location_key("Jyväskylä"), location_key("jyvaskyla"))
+        self.assertEqual(location_key("New  York"), location_key("new york"))
+        self.assertNotEqual(location_key("Paris", "FI"), location_key("Paris", "US"))
+
+    async def test_repeat_lookup_skips_geocoder(self):
+        get = AsyncMock(return_value=create_response(TAMPERE))
+        with patch.object(weathersearch, "get", get):
+            coords = await WeatherSearch()._get_coords("Tampere")
+            self.assertEqual(await WeatherSearch()._get_coords(" tampere"), coords)
+        self.assertEqual(coords, {"lat": 61.4978, "lng": 23.761})
+        self.assertEqual(get.await_count, 1)
+
+        # Coordinates are shared with other containers through cache backend
+        weathersearch._geocodes.clear()
+        with patch.object(weathersearch, "get", AsyncMock()) as get:
+            self.assertEqual(await WeatherSearch()._get_coords("TAMPERE"), coords)
+        get.assert_not_awaited()
+
+    async def test_unknown_place_is_cached(self):
+        get = AsyncMock(return_value=create_response({"status": "ZERO_RESULTS", "results": []}))
+        with patch.object(weathersearch, "get", get):
+            self.assertIsNone(await WeatherSearch()._get_coords("Nowhere"))
+            self.assertIsNone(await WeatherSearch()._get_coords("nowhere"))
+        self.assertEqual(get.await_count, 1)
+
+    async def test_geocoder_error_is_not_cached(self):
+        get = AsyncMock(return_value=create_response({"status": "OVER_QUERY_LIMIT", "results": []}))
+        with patch.object(weathersearch, "get", get):
+            self.assertIsNone(await WeatherSearch()._get_coords("Tampere"))
+            self.assertIsNone(await WeatherSearch()._get_coords("Tampere"))
+        self.assertEqual(get.await_count, 2)
+
+
+OBSERVATION = {
+    "weather": [{"description": "light snow", "icon": "13d"}],
+    "main": {"temp": -3.24, "humidity": 86, "pressure": 1012},
+    "wind": {"speed": 4.12},
+    "clouds": {"all": 75},
+    "snow": {"1h": 0.31},
+}
+
+
+class TestObservationCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        patchers = [
+            patch.object(weathersearch, "_observations", TTLCache(max_entries=256)),
+            patch.object(weathersearch, "_observation_flights", SingleFlight("Test")),
+            patch.object(weathersearch, "cache_backend", MemoryBackend()),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_nearby_coordinates_share_observation(self):
+        get = AsyncMock(return_value=create_response(OBSERVATION))
+        with patch.object(weathersearch, "get", get):
+            weather_search = WeatherSearch()
+            data = await weather_search._get_observation({"lat": 61.4978, "lng": 23.761})
+            nearby = await weather_search._get_observation({"lat": 61.51, "lng": 23.77})
+        self.assertIs(nearby, data)
+        self.assertEqual(get.await_count, 1)
+        self.assertEqual(get.call_args.args[1]["lat"], 61.5)
+        self.assertEqual(get.call_args.args[1]["lon"], 23.75)
+
+    async def test_concurrent_lookups_share_request(self):
+        async def get(url, params):
+            await asyncio.sleep(0.01)
+            return create_response(OBSERVATION)
+
+        get = AsyncMock(side_effect=get)
+        coords = {"lat": 61.4978, "lng": 23.761}
+        with (
+            patch.object(weathersearch, "get", get),
+            patch.object(WeatherSearch, "_get_coords", AsyncMock(return_value=coords)),
+        ):
+            infos = await asyncio.gather(*(WeatherSearch().get_info("Tampere") for _ in range(3)))
+        self.assertEqual(get.await_count, 1)
+        self.assertEqual(infos[0]["temperature"], -3.2)
+        self.assertEqual(infos[0]["precipType"], "snow")
+        self.assertEqual(infos[1:], infos[:2])
+        self.assertEqual(len(weathersearch._observation_flights), 0)
+        self.assertEqual(weathersearch._observation_flights.stats()["callers"], 3)
+
+    async def test_failed_observation_is_not_cached(self):
+        get = AsyncMock(side_effect=[Exception("timeout"), create_response(OBSERVATION)])
+        coords = {"lat": 61.4978, "lng": 23.761}
+        with patch.object(weathersearch, "get", get):
+            with self.assertRaises(Exception):
+                await WeatherSearch()._get_observation(coords)
+            self.assertEqual(await WeatherSearch()._get_observation(coords), OBSERVATION)
+
+
+if __name__ == "__main__":
+    unittest.main()